@@ -0,0 +1,113 @@
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# compact on load once the file holds this many more lines than live entries
+COMPACT_MIN_STALE_LINES = 100
+
+
+class DownloadArchive:
+    """Record of finished downloads, keyed by video ID + format, so repeats are skipped.
+
+    Lookups are served from memory; the file is append-only JSON lines, one record per
+    download, where a later record for the same key wins and a "removed" record drops
+    it. Every record is a single append, so concurrent jobs (and processes) never
+    interleave partial lines. compact() rewrites the file with only the live entries.
+    """
+
+    def __init__(self, path=None, verify=True):
+        self.path = path
+        self.verify = verify
+        self._entries = {}  # (video_id, format) -> {"path", "size", "at"}
+        self._lock = threading.Lock()
+        self._lines = 0
+        self._torn = False  # the file ends in a partial line, e.g. after a crash
+
+        if path:
+            self._load()
+            if self._lines - len(self._entries) >= max(COMPACT_MIN_STALE_LINES, len(self._entries)):
+                self.compact()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def get(self, video_id, fmt):
+        """The entry for a downloaded video, or None.
+
+        With `verify`, an entry whose file is gone or has a different size is dropped,
+        so the video downloads again.
+        """
+        with self._lock:
+            entry = self._entries.get((video_id, fmt))
+        if entry is None or not self.verify:
+            return entry
+        try:
+            valid = os.path.getsize(entry["path"]) == entry["size"]
+        except OSError:
+            valid = False
+        if valid:
+            return entry
+        logger.warning(f"Archived download of {video_id} is missing or changed: {entry['path']}")
+        self.remove(video_id, fmt)
+        return None
+
+    def add(self, video_id, fmt, path):
+        entry = {"path": path, "size": os.path.getsize(path), "at": time.time()}
+        with self._lock:
+            self._entries[(video_id, fmt)] = entry
+            self._append({"video_id": video_id, "format": fmt, **entry})
+
+    def remove(self, video_id, fmt):
+        with self._lock:
+            if self._entries.pop((video_id, fmt), None) is not None:
+                self._append({"video_id": video_id, "format": fmt, "removed": True})
+
+    def compact(self):
+        # rewrites the file with one line per live entry
+        if not self.path:
+            return
+        with self._lock:
+            tmp_path = f"{self.path}.tmp"
+            try:
+                with open(tmp_path, "w") as f:
+                    for (video_id, fmt), entry in self._entries.items():
+                        f.write(json.dumps({"video_id": video_id, "format": fmt, **entry}) + "\n")
+                os.replace(tmp_path, self.path)
+                self._torn = False
+                self._lines = len(self._entries)
+            except OSError as e:
+                logger.warning(f"Error compacting download archive: {e}")
+
+    def _append(self, record):
+        # called with the lock held
+        if not self.path:
+            return
+        try:
+            with open(self.path, "a") as f:
+                f.write(("\n" if self._torn else "") + json.dumps(record) + "\n")
+            self._torn = False
+            self._lines += 1
+        except OSError as e:
+            logger.warning(f"Error writing download archive: {e}")
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r") as f:
+            for line in f:
+                self._lines += 1
+                self._torn = not line.endswith("\n")
+                try:
+                    record = json.loads(line)
+                    key = (record.pop("video_id"), record.pop("format"))
+                except (ValueError, KeyError, AttributeError):
+                    continue  # e.g. a line cut short by a crash
+                if record.get("removed"):
+                    self._entries.pop(key, None)
+                else:
+                    self._entries[key] = record
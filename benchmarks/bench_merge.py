@@ -0,0 +1,105 @@
+"""Compares the old concat-filter merge with the stream-copy remux in mux.py.
+
+Generates short sample streams with ffmpeg (or takes --video/--audio files) and times
+each merge path. Usage: python benchmarks/bench_merge.py [--duration 30] [--runs 3]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import ffmpeg
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mux import merge_streams  # noqa: E402
+
+SAMPLES = {
+    # name: (video file, video encoder, video codec tag, audio file, audio encoder, audio codec tag)
+    "mp4": ("video.mp4", "libx264", "avc1", "audio.m4a", "aac", "mp4a"),
+    "webm": ("video.webm", "libvpx-vp9", "vp9", "audio.webm", "libopus", "opus"),
+}
+
+
+def make_samples(directory, duration):
+    paths = {}
+    for name, (video_file, vencoder, vtag, audio_file, aencoder, atag) in SAMPLES.items():
+        video_path = os.path.join(directory, video_file)
+        audio_path = os.path.join(directory, audio_file)
+        (
+            ffmpeg.input(f"testsrc2=size=1280x720:rate=30:duration={duration}", f="lavfi")
+            .output(video_path, vcodec=vencoder, pix_fmt="yuv420p", **{"b:v": "2M"})
+            .run(overwrite_output=True, quiet=True)
+        )
+        (
+            ffmpeg.input(f"sine=frequency=440:duration={duration}", f="lavfi")
+            .output(audio_path, acodec=aencoder, **{"b:a": "128k"})
+            .run(overwrite_output=True, quiet=True)
+        )
+        paths[name] = (video_path, vtag, audio_path, atag)
+    return paths
+
+
+def legacy_merge(video_path, audio_path, output_base):
+    # the merge the app shipped with: a concat filtergraph, which cannot be stream-copied
+    output_path = f"{output_base}.mp4"
+    start = time.perf_counter()
+    try:
+        (
+            ffmpeg.concat(ffmpeg.input(video_path), ffmpeg.input(audio_path), v=1, a=1)
+            .output(output_path, vcodec="copy", acodec="copy")
+            .run(overwrite_output=True, quiet=True)
+        )
+    except ffmpeg.Error:
+        return None
+    return time.perf_counter() - start
+
+
+def legacy_transcode_merge(video_path, audio_path, output_base):
+    # what the concat path costs once the copy flags are dropped so it can actually run
+    output_path = f"{output_base}.mp4"
+    start = time.perf_counter()
+    (
+        ffmpeg.concat(ffmpeg.input(video_path), ffmpeg.input(audio_path), v=1, a=1)
+        .output(output_path)
+        .run(overwrite_output=True, quiet=True)
+    )
+    return time.perf_counter() - start
+
+
+def time_runs(func, runs):
+    timings = [func() for _ in range(runs)]
+    if any(t is None for t in timings):
+        return "failed"
+    return f"{statistics.median(timings):.3f}s"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duration", type=int, default=30, help="length of the generated samples in seconds")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--video", help="use this video file instead of generated samples")
+    parser.add_argument("--audio", help="use this audio file instead of generated samples")
+    parser.add_argument("--vcodec", default="avc1", help="codec tag of --video")
+    parser.add_argument("--acodec", default="mp4a", help="codec tag of --audio")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.video and args.audio:
+            samples = {"custom": (args.video, args.vcodec, args.audio, args.acodec)}
+        else:
+            samples = make_samples(tmp, args.duration)
+
+        out = os.path.join(tmp, "merged")
+        print(f"{'sample':<8} {'concat+copy':>12} {'concat':>10} {'remux':>10}")
+        for name, (video_path, vtag, audio_path, atag) in samples.items():
+            concat_copy = time_runs(lambda: legacy_merge(video_path, audio_path, out), args.runs)
+            concat = time_runs(lambda: legacy_transcode_merge(video_path, audio_path, out), args.runs)
+            remux = time_runs(lambda: merge_streams(video_path, audio_path, out, vtag, atag)[1], args.runs)
+            print(f"{name:<8} {concat_copy:>12} {concat:>10} {remux:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+"""End-to-end pipeline benchmarks, fully offline.
+
+A FakeYouTubeBackend stands in for YouTube and a local MediaServer serves the streams
+with simulated latency and bandwidth, so runs are repeatable and need no network.
+Measures metadata fetch latency (cold and cached), single and parallel download
+throughput, merge time, UI-update overhead and, with --engine, whole jobs through the
+Engine. Results are saved as JSON under benchmarks/results/ so runs can be compared.
+Usage: python benchmarks/bench_pipeline.py [--runs 3] [--latency-ms 50] [--bandwidth-mb 0]
+       [--compare latest|FILE]
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT_DIR, "benchmarks", "results")
+sys.path.insert(0, ROOT_DIR)
+
+from downloader import SegmentedDownloader, download_parallel  # noqa: E402
+from engine import Engine  # noqa: E402
+from jobs import DONE, DownloadJob  # noqa: E402
+from metadata_cache import MetadataCache, sort_streams  # noqa: E402
+from mux import merge_streams  # noqa: E402
+from ratelimit import RateLimiter  # noqa: E402
+from ui_updates import UiUpdateQueue  # noqa: E402
+
+from fake_youtube import FakeYouTubeBackend  # noqa: E402
+from fixtures import FIXTURES, make_fixtures  # noqa: E402
+from media_server import MediaServer  # noqa: E402
+
+MB = 1024 ** 2
+
+# results where a larger number is better; for everything else (seconds) smaller is
+HIGHER_IS_BETTER = ("_per_s",)
+# smaller changes are reported without a verdict
+NOISE_PERCENT = 5
+
+
+class HeadlessMaster:
+    """Just enough of a Tk widget for UiUpdateQueue: after() callbacks run on run_frame()."""
+
+    def __init__(self):
+        self._pending = []
+
+    def after(self, ms, fn):
+        self._pending.append(fn)
+
+    def run_frame(self):
+        pending, self._pending = self._pending, []
+        for fn in pending:
+            fn()
+
+
+def median_of(func, runs):
+    return statistics.median(func() for _ in range(runs))
+
+
+def bench_fetch(backend, links, runs):
+    # cold: every lookup goes to the backend; warm: served by the cache
+    cold, warm = [], []
+    for _ in range(runs):
+        cache = MetadataCache(youtube=backend)
+        for link in links:
+            start = time.perf_counter()
+            cache.resolve(link)
+            cold.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            cache.resolve(link)
+            warm.append(time.perf_counter() - start)
+    return {
+        "fetch_cold_s": statistics.median(cold),
+        "fetch_warm_s": statistics.median(warm),
+    }
+
+
+def bench_downloads(cache, link, directory, runs, parallel):
+    info = cache.resolve(link)
+    streams = sort_streams(info.video_streams)[:parallel] + sort_streams(info.audio_streams)[:1]
+    downloader = SegmentedDownloader(limiter=RateLimiter())
+
+    def single():
+        stream = streams[0]
+        path = os.path.join(directory, "single.bin")
+        start = time.perf_counter()
+        downloader.download_any(stream, path)
+        elapsed = time.perf_counter() - start
+        os.remove(path)
+        return stream.filesize / MB / elapsed
+
+    def several():
+        downloads = [(s, os.path.join(directory, f"parallel_{s.itag}.bin")) for s in streams]
+        start = time.perf_counter()
+        download_parallel(downloads, downloader=downloader)
+        elapsed = time.perf_counter() - start
+        for _, path in downloads:
+            os.remove(path)
+        return sum(s.filesize for s in streams) / MB / elapsed
+
+    return {
+        "download_single_mb_per_s": median_of(single, runs),
+        "download_parallel_mb_per_s": median_of(several, runs),
+        "download_parallel_streams": len(streams),
+    }
+
+
+def bench_merge(paths, directory, runs):
+    video_tag = FIXTURES["video"][1]
+    audio_tag = FIXTURES["audio"][1]
+    output_base = os.path.join(directory, "merged")
+
+    def merge():
+        start = time.perf_counter()
+        output_path, _ = merge_streams(paths["video"], paths["audio"], output_base, video_tag, audio_tag)
+        elapsed = time.perf_counter() - start
+        os.remove(output_path)
+        return elapsed
+
+    return {"merge_s": median_of(merge, runs)}
+
+
+def bench_ui_updates(threads=4, jobs_per_thread=8, updates=20000, frames=30):
+    """Cost of queueing progress from worker threads and of draining a frame of it."""
+    master = HeadlessMaster()
+    queue = UiUpdateQueue(master)
+    applied = []
+
+    def worker(n):
+        for i in range(updates):
+            queue.coalesce(("progress", n, i % jobs_per_thread), applied.append, i)
+            if i % 1000 == 0:
+                queue.call(applied.append, i)
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    start = time.perf_counter()
+    for t in workers:
+        t.start()
+
+    drains = []
+    while any(t.is_alive() for t in workers) or len(drains) < frames:
+        frame_start = time.perf_counter()
+        master.run_frame()
+        drains.append(time.perf_counter() - frame_start)
+        time.sleep(queue.interval / 1000)
+    for t in workers:
+        t.join()
+    queue_seconds = time.perf_counter() - start
+    master.run_frame()
+
+    return {
+        "ui_update_queue_us": queue_seconds / (threads * updates) * 1e6,
+        "ui_frame_drain_ms": statistics.median(drains) * 1000,
+        "ui_frame_drain_max_ms": max(drains) * 1000,
+        "ui_updates_per_s": threads * updates / queue_seconds,
+    }
+
+
+def bench_engine(backend, media, directory, videos):
+    # whole jobs (fetch, parallel download, merge, cleanup) for videos backed by the fixtures
+    links = [backend.add_video(f"engine{n:05d}", media=media) for n in range(videos)]
+    engine = Engine(MetadataCache(youtube=backend), downloader=SegmentedDownloader(limiter=RateLimiter()))
+    start = time.perf_counter()
+    jobs = [
+        engine.submit(DownloadJob(link, output_template=os.path.join(directory, "{video_id}")))
+        for link in links
+    ]
+    engine.wait()
+    elapsed = time.perf_counter() - start
+    failed = [job for job in jobs if job.state != DONE]
+    for job in failed:
+        print(f"engine job {job.link} ended {job.state}: {job.error}")
+    return {
+        "engine_total_s": elapsed,
+        "engine_jobs_per_s": len(jobs) / elapsed,
+        "engine_failed_jobs": len(failed),
+    }
+
+
+def git_commit():
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR,
+                                capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+
+def save_results(results, args):
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, time.strftime("%Y%m%d-%H%M%S") + ".json")
+    data = {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "args": vars(args),
+        "results": results,
+    }
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2)
+    return path
+
+
+def load_baseline(name, exclude=None):
+    if name != "latest":
+        with open(name) as f:
+            return name, json.load(f)
+    paths = [p for p in sorted(glob.glob(os.path.join(RESULTS_DIR, "*.json"))) if p != exclude]
+    if not paths:
+        return None, None
+    with open(paths[-1]) as f:
+        return paths[-1], json.load(f)
+
+
+def print_results(results, baseline=None):
+    print(f"{'benchmark':<30} {'value':>12}" + (f" {'baseline':>12} {'change':>9}" if baseline else ""))
+    for name, value in results.items():
+        line = f"{name:<30} {value:>12.4g}"
+        old = (baseline or {}).get(name)
+        if old:
+            change = (value - old) / old * 100
+            better = change > 0 if name.endswith(HIGHER_IS_BETTER) else change < 0
+            line += f" {old:>12.4g} {change:>+8.1f}%"
+            if abs(change) >= NOISE_PERCENT:
+                line += " better" if better else " worse"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3, help="repetitions per benchmark (default: %(default)s)")
+    parser.add_argument("--latency-ms", type=float, default=50,
+                        help="simulated YouTube and per-request server latency (default: %(default)s)")
+    parser.add_argument("--bandwidth-mb", type=float, default=0,
+                        help="per-connection bandwidth in MB/s, 0 for unthrottled (default: %(default)s)")
+    parser.add_argument("--size-scale", type=float, default=0.25,
+                        help="scales the synthetic stream sizes, 1 means a 24 MB 1080p stream (default: %(default)s)")
+    parser.add_argument("--videos", type=int, default=5, help="videos to look up for fetch latency (default: %(default)s)")
+    parser.add_argument("--parallel", type=int, default=3,
+                        help="video streams downloaded at once, plus one audio stream (default: %(default)s)")
+    parser.add_argument("--engine", type=int, default=0, metavar="N",
+                        help="also run N whole jobs through the Engine (default: %(default)s)")
+    parser.add_argument("--compare", metavar="FILE", help="compare with a saved result, or 'latest'")
+    parser.add_argument("--no-save", action="store_true", help="don't write the results file")
+    args = parser.parse_args()
+
+    latency = args.latency_ms / 1000
+    server = MediaServer(latency=latency, bandwidth=args.bandwidth_mb * MB or None).start()
+    paths = make_fixtures()
+    backend = FakeYouTubeBackend(server, latency=latency, size_scale=args.size_scale, thumbnail=paths["thumbnail"])
+    links = [backend.add_video(f"bench{n:06d}") for n in range(args.videos)]
+
+    results = {}
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            print("fetch latency...")
+            results.update(bench_fetch(backend, links, args.runs))
+            print("download throughput...")
+            results.update(bench_downloads(MetadataCache(youtube=backend), links[0], tmp, args.runs, args.parallel))
+            print("merge...")
+            results.update(bench_merge(paths, tmp, args.runs))
+            print("UI updates...")
+            results.update(bench_ui_updates())
+            if args.engine:
+                print("engine jobs...")
+                media = {kind: (paths[kind], FIXTURES[kind][1]) for kind in ("video", "audio")}
+                results.update(bench_engine(backend, media, tmp, args.engine))
+    finally:
+        server.stop()
+
+    saved = None if args.no_save else save_results(results, args)
+    baseline_path, baseline = load_baseline(args.compare, exclude=saved) if args.compare else (None, None)
+    if args.compare and baseline is None:
+        print("No earlier results to compare with")
+    elif baseline_path:
+        print(f"compared with {os.path.relpath(baseline_path)} ({baseline.get('commit')}, {baseline.get('time')})")
+    print_results(results, baseline and baseline["results"])
+    if saved:
+        print(f"saved {os.path.relpath(saved)}")
+
+
+if __name__ == "__main__":
+    main()
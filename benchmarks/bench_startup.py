@@ -0,0 +1,69 @@
+"""Startup import cost of the app, with a regression budget.
+
+Imports the module in fresh interpreters under `python -X importtime`, reports the
+median total and the slowest top-level imports, and exits non-zero if the median is
+over budget or a module that should load lazily was imported at startup.
+Usage: python benchmarks/bench_startup.py [--module main] [--runs 5] [--budget-ms 250]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# imported on first fetch, merge or thumbnail, never at startup
+LAZY_MODULES = ("pytubefix", "requests", "ffmpeg", "aiohttp")
+
+
+def import_times(module):
+    # ({top-level module: cumulative microseconds}, {any module: cumulative microseconds})
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT_DIR, capture_output=True, text=True, check=True,
+    )
+    times, imported = {}, {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue  # header line
+        imported[name.strip()] = int(cumulative)
+        if not name.startswith("  "):  # top level only, nested imports are indented
+            times[name.strip()] = int(cumulative)
+    return times, imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default="main", help="module to import (default: %(default)s)")
+    parser.add_argument("--runs", type=int, default=5, help="cold imports to measure (default: %(default)s)")
+    parser.add_argument("--budget-ms", type=float, default=250, help="median import time allowed (default: %(default)s)")
+    parser.add_argument("--top", type=int, default=10, help="slowest imports to list (default: %(default)s)")
+    args = parser.parse_args()
+
+    runs = [import_times(args.module) for _ in range(args.runs)]
+    totals = [sum(times.values()) / 1000 for times, _ in runs]
+    median = statistics.median(totals)
+
+    print(f"import {args.module}: median {median:.1f}ms over {args.runs} runs (budget {args.budget_ms:.0f}ms)")
+    _, imported = runs[-1]
+    slowest = sorted((item for item in imported.items() if item[0] != args.module), key=lambda item: item[1], reverse=True)
+    for name, micros in slowest[:args.top]:
+        print(f"  {micros / 1000:>8.1f}ms  {name}")
+
+    failed = False
+    eager = sorted({name.split(".")[0] for name in imported} & set(LAZY_MODULES))
+    if eager:
+        print(f"FAIL: imported at startup: {', '.join(eager)}")
+        failed = True
+    if median > args.budget_ms:
+        print(f"FAIL: {median:.1f}ms is over the {args.budget_ms:.0f}ms budget")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
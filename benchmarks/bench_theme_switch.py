@@ -0,0 +1,90 @@
+"""Measures theme switch latency with many stream buttons on screen.
+
+Compares the old switch (re-read the theme JSON, destroy and rebuild every widget) with
+the in-place recolor of theme_registry. Needs a display.
+Usage: python benchmarks/bench_theme_switch.py [--buttons 400] [--switches 10]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import customtkinter as ctk
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from theme_registry import ThemeRegistry  # noqa: E402
+
+THEMES = {
+    "Autumn": os.path.join(ROOT_DIR, "themes", "autumn.json"),
+    "Midnight": os.path.join(ROOT_DIR, "themes", "midnight.json"),
+    "Sky": os.path.join(ROOT_DIR, "themes", "sky.json"),
+    "Blue": "blue",
+}
+
+
+def build_ui(root, buttons):
+    # roughly the main window: two stream lists full of buttons plus a few controls
+    for widget in root.winfo_children():
+        widget.destroy()
+
+    lists_frame = ctk.CTkFrame(root)
+    lists_frame.pack(fill="both", expand=True, padx=10, pady=10)
+    for side in ("left", "right"):
+        scroll = ctk.CTkScrollableFrame(lists_frame, label_text="Streams")
+        scroll.pack(side=side, fill="both", expand=True, padx=5, pady=5)
+        for i in range(buttons // 2):
+            ctk.CTkButton(scroll, text=f"{1080 - i}p | 30fps | MP4", anchor="w").pack(pady=3, padx=5, fill="x")
+
+    control_frame = ctk.CTkFrame(root)
+    control_frame.pack(fill="x", padx=10, pady=10)
+    ctk.CTkEntry(control_frame, placeholder_text="Enter YouTube URL here...").pack(side="left", padx=5)
+    ctk.CTkProgressBar(control_frame).pack(side="left", padx=5)
+    ctk.CTkOptionMenu(control_frame, values=list(THEMES)).pack(side="left", padx=5)
+    root.update()
+
+
+def time_switches(root, switches, switch):
+    names = list(THEMES)
+    timings = []
+    for i in range(switches):
+        start = time.perf_counter()
+        switch(names[i % len(names)])
+        root.update()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--buttons", type=int, default=400, help="stream buttons on screen (default: %(default)s)")
+    parser.add_argument("--switches", type=int, default=10, help="theme switches per method (default: %(default)s)")
+    args = parser.parse_args()
+
+    root = ctk.CTk()
+    root.geometry("850x900")
+
+    def rebuild(name):
+        ctk.set_default_color_theme(THEMES[name])
+        build_ui(root, args.buttons)
+
+    registry = ThemeRegistry(THEMES)
+
+    def recolor(name):
+        registry.activate(name, root)
+
+    print(f"{args.buttons} buttons, {args.switches} switches")
+    print(f"{'method':<10} {'median':>10} {'max':>10}")
+    for label, switch in (("rebuild", rebuild), ("recolor", recolor)):
+        registry.activate("Blue")
+        build_ui(root, args.buttons)
+        timings = time_switches(root, args.switches, switch)
+        print(f"{label:<10} {statistics.median(timings) * 1000:>8.1f}ms {max(timings) * 1000:>8.1f}ms")
+
+    root.destroy()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""Offline stand-in for pytubefix.YouTube, serving canned metadata and media from a MediaServer.
+
+    server = MediaServer(bandwidth=4 * 1024 ** 2).start()
+    backend = FakeYouTubeBackend(server, latency=0.2)
+    link = backend.add_video("bench000001", "Sample video")
+    cache = MetadataCache(youtube=backend)
+
+Each video gets the usual DASH ladder (see CANNED_STREAMS) backed by random bytes of
+the listed size, or by real media files for videos added with `media` (e.g. the ffmpeg
+fixtures), so merges work. Only the parts of the pytubefix API the app uses exist.
+"""
+import functools
+import os
+import threading
+import time
+
+from metadata_cache import canonical_video_id
+
+# itag, mime type, codec, resolution or bitrate, fps, size in bytes (before `size_scale`)
+CANNED_STREAMS = (
+    (137, "video/mp4", "avc1.640028", "1080p", 30, 24 * 1024 ** 2),
+    (248, "video/webm", "vp9", "1080p", 30, 20 * 1024 ** 2),
+    (136, "video/mp4", "avc1.4d401f", "720p", 30, 12 * 1024 ** 2),
+    (247, "video/webm", "vp9", "720p", 30, 10 * 1024 ** 2),
+    (135, "video/mp4", "avc1.4d401e", "480p", 30, 6 * 1024 ** 2),
+    (160, "video/mp4", "avc1.4d400c", "144p", 30, 1024 ** 2),
+    (140, "audio/mp4", "mp4a.40.2", "128kbps", None, 2 * 1024 ** 2),
+    (251, "audio/webm", "opus", "160kbps", None, 2 * 1024 ** 2),
+    (139, "audio/mp4", "mp4a.40.5", "48kbps", None, 1024 ** 2),
+)
+
+
+class FakeStream:
+    def __init__(self, itag, url, mime_type, codec, quality, fps, filesize):
+        self.itag = itag
+        self.url = url
+        self.mime_type = mime_type
+        self.type, self.subtype = mime_type.split("/")
+        is_video = self.type == "video"
+        self.video_codec = codec if is_video else None
+        self.audio_codec = None if is_video else codec
+        self.resolution = quality if is_video else None
+        self.abr = None if is_video else quality
+        self.fps = fps
+        self.filesize = filesize
+        self.is_progressive = False
+        self.is_hdr = False
+
+
+class FakeStreamQuery(list):
+    def filter(self, progressive=None, type=None, only_audio=False):
+        return FakeStreamQuery(
+            s for s in self
+            if (progressive is None or s.is_progressive == progressive)
+            and (type is None or s.type == type)
+            and (not only_audio or s.type == "audio")
+        )
+
+    def get_by_itag(self, itag):
+        return next((s for s in self if s.itag == itag), None)
+
+
+class FakeYouTube:
+    def __init__(self, video_id, title, thumbnail_url, streams):
+        self.video_id = video_id
+        self.title = title
+        self.thumbnail_url = thumbnail_url
+        self.streams = FakeStreamQuery(streams)
+
+
+class FakeYouTubeBackend:
+    """Callable taking a link and returning a FakeYouTube, after `latency` seconds.
+
+    Pass it as MetadataCache(youtube=...). `lookups` counts the calls, i.e. how often
+    the app would have gone to YouTube.
+    """
+
+    def __init__(self, server, latency=0.0, size_scale=1.0, thumbnail=None):
+        self.server = server
+        self.latency = latency
+        self.size_scale = size_scale
+        self.lookups = 0
+        self._videos = {}  # video_id -> FakeYouTube
+        self._lock = threading.Lock()
+        self._thumbnail_url = server.add("/thumbnail.jpg", _read(thumbnail)) if thumbnail else ""
+
+    def add_video(self, video_id, title=None, media=None, streams=CANNED_STREAMS):
+        """Registers a video and returns its watch URL.
+
+        `media` maps "video"/"audio" to (file path, codec tag): the video then has one
+        stream of each, serving the file, instead of the synthetic ladder.
+        """
+        if media:
+            video_path, video_codec = media["video"]
+            audio_path, audio_codec = media["audio"]
+            streams = (
+                (160, "video/mp4", video_codec, "144p", 30, _read(video_path)),
+                (140, "audio/mp4", audio_codec, "128kbps", None, _read(audio_path)),
+            )
+
+        fake_streams = []
+        for itag, mime_type, codec, quality, fps, content in streams:
+            if isinstance(content, int):
+                content = _synthetic(max(1, int(content * self.size_scale)))
+            # with a query string like the real ones, pytubefix appends "&range=..." to it
+            url = self.server.add(f"/media/{video_id}/{itag}", content) + f"?itag={itag}"
+            fake_streams.append(FakeStream(itag, url, mime_type, codec, quality, fps, len(content)))
+
+        with self._lock:
+            self._videos[video_id] = FakeYouTube(video_id, title or f"Video {video_id}", self._thumbnail_url,
+                                                 fake_streams)
+        return f"https://www.youtube.com/watch?v={video_id}"
+
+    def __call__(self, link):
+        with self._lock:
+            self.lookups += 1
+        if self.latency:
+            time.sleep(self.latency)
+        video = self._videos.get(canonical_video_id(link))
+        if video is None:
+            raise ValueError(f"{link} is not a registered fake video")
+        return video
+
+
+@functools.lru_cache(maxsize=None)
+def _synthetic(size):
+    # random, so nothing on the way can compress it; shared by every stream of that size
+    return os.urandom(size)
+
+
+def _read(path):
+    with open(path, "rb") as f:
+        return f.read()
@@ -0,0 +1,44 @@
+"""Tiny media files generated with ffmpeg, cached between runs.
+
+The clips are a few seconds of test pattern and sine tone, small enough to generate in
+well under a second, but real H.264/AAC so merges and conversions behave as they do
+with YouTube streams.
+"""
+import os
+
+import ffmpeg
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+FIXTURES = {
+    # name: (file, codec tag the fake streams advertise)
+    "video": ("video_144p.mp4", "avc1.4d400c"),
+    "audio": ("audio_128k.m4a", "mp4a.40.2"),
+    "thumbnail": ("thumbnail.jpg", None),
+}
+
+
+def make_fixtures(directory=FIXTURE_DIR, duration=2):
+    """Returns {name: path}, generating any file that isn't there yet."""
+    os.makedirs(directory, exist_ok=True)
+    paths = {name: os.path.join(directory, file) for name, (file, _) in FIXTURES.items()}
+
+    if not os.path.exists(paths["video"]):
+        (
+            ffmpeg.input(f"testsrc2=size=256x144:rate=30:duration={duration}", f="lavfi")
+            .output(paths["video"], vcodec="libx264", pix_fmt="yuv420p", preset="ultrafast", movflags="+faststart")
+            .run(overwrite_output=True, quiet=True)
+        )
+    if not os.path.exists(paths["audio"]):
+        (
+            ffmpeg.input(f"sine=frequency=440:duration={duration}", f="lavfi")
+            .output(paths["audio"], acodec="aac", **{"b:a": "128k"})
+            .run(overwrite_output=True, quiet=True)
+        )
+    if not os.path.exists(paths["thumbnail"]):
+        (
+            ffmpeg.input("testsrc2=size=480x270:rate=1:duration=1", f="lavfi")
+            .output(paths["thumbnail"], vframes=1)
+            .run(overwrite_output=True, quiet=True)
+        )
+    return paths
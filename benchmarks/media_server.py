@@ -0,0 +1,131 @@
+"""Local HTTP server for synthetic media, with Range support and simulated network conditions.
+
+    server = MediaServer(latency=0.05, bandwidth=2 * 1024 ** 2).start()
+    url = server.add("/video/137", data)
+    ...
+    server.stop()
+
+`latency` (seconds) delays every response before its headers and `bandwidth` (bytes
+per second) paces the body of each connection, like a per-connection throttle.
+Byte ranges come from a Range header (answered with 206) or, like YouTube, a
+`range=start-end` query parameter (answered with 200, which pytubefix's sequential
+download uses). With `ranges=False` the server ignores both and always sends the
+whole body, like some CDNs and proxies. All three can be changed while the server runs.
+"""
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+CHUNK_SIZE = 64 * 1024
+
+
+class MediaServer:
+    def __init__(self, latency=0.0, bandwidth=None, ranges=True, host="127.0.0.1", port=0):
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.ranges = ranges
+        self.requests = 0
+        self.bytes_sent = 0
+        self._blobs = {}  # path -> bytes
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def add(self, path, data):
+        # serves `data` at `path`; returns its URL
+        self._blobs[path] = data
+        return self.base_url + path
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True, name="media-server").start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _count(self, nbytes):
+        with self._lock:
+            self.bytes_sent += nbytes
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_HEAD(self):
+                self._respond(send_body=False)
+
+            def do_GET(self):
+                self._respond(send_body=True)
+
+            def _respond(self, send_body):
+                with server._lock:
+                    server.requests += 1
+                url = urlsplit(self.path)
+                data = server._blobs.get(url.path)
+                if server.latency:
+                    time.sleep(server.latency)
+                if data is None:
+                    self.send_error(404)
+                    return
+
+                start, end = 0, len(data) - 1
+                range_header = self.headers.get("Range")
+                match = re.fullmatch(r"bytes=(\d+)-(\d*)", range_header or "")
+                query_range = parse_qs(url.query).get("range", [""])[0]
+                if not match and server.ranges and query_range:
+                    # YouTube style: the slice comes back as a plain 200, empty past the end
+                    first, _, last = query_range.partition("-")
+                    end = min(int(last), end) if last else end
+                    start = min(int(first), end + 1)
+                    self.send_response(200)
+                elif match and server.ranges:
+                    start = int(match.group(1))
+                    end = min(int(match.group(2)) if match.group(2) else end, len(data) - 1)
+                    if start > end:
+                        self.send_response(416)
+                        self.send_header("Content-Range", f"bytes */{len(data)}")
+                        self.send_header("Content-Length", "0")
+                        self.end_headers()
+                        return
+                    self.send_response(206)
+                    self.send_header("Content-Range", f"bytes {start}-{end}/{len(data)}")
+                else:
+                    self.send_response(200)
+                if server.ranges:
+                    self.send_header("Accept-Ranges", "bytes")
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Length", str(end - start + 1))
+                self.end_headers()
+                if send_body:
+                    self._send_body(data, start, end)
+
+            def _send_body(self, data, start, end):
+                began = time.perf_counter()
+                sent = 0
+                for offset in range(start, end + 1, CHUNK_SIZE):
+                    chunk = data[offset:min(offset + CHUNK_SIZE, end + 1)]
+                    try:
+                        self.wfile.write(chunk)
+                    except (BrokenPipeError, ConnectionResetError):
+                        return  # the client gave up, e.g. a cancelled download
+                    sent += len(chunk)
+                    server._count(len(chunk))
+                    if server.bandwidth:
+                        ahead = sent / server.bandwidth - (time.perf_counter() - began)
+                        if ahead > 0:
+                            time.sleep(ahead)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
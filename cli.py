@@ -0,0 +1,179 @@
+"""Headless downloader: python -m cli [options] URL [URL ...]
+
+Progress is written to stdout as JSON lines, one object per event; diagnostics go to
+stderr. Exits non-zero if any job fails.
+"""
+import argparse
+import json
+import logging
+import sys
+import threading
+import time
+
+from convert import ConvertTarget
+from archive import DownloadArchive
+from engine import DOWNLOAD_ARCHIVE_FILE, METADATA_CACHE_FILE, Engine
+from formats import DEFAULT_FORMAT, FormatSelector
+from jobs import DEFAULT_OUTPUT_TEMPLATE, DONE, FAILED, MAX_CONCURRENT_DOWNLOADS, PROGRESS_STATES, SKIPPED
+from metadata_cache import MetadataCache
+from metrics import metrics
+from ratelimit import parse_rate
+
+PROGRESS_INTERVAL = 0.5
+METRICS_FILE_INTERVAL = 5
+
+
+class JsonLinesReporter:
+    """Job listener writing state changes, and progress at most every `interval` seconds."""
+
+    def __init__(self, out, interval=PROGRESS_INTERVAL, limiter=None):
+        self.out = out
+        self.interval = interval
+        self.limiter = limiter  # adds the aggregate speed of every transfer to progress lines
+        self._last = {}  # job id -> (state, time of last line)
+        self._lock = threading.Lock()
+
+    def emit(self, event, **fields):
+        with self._lock:
+            self.out.write(json.dumps({"event": event, "time": round(time.time(), 3), **fields}) + "\n")
+            self.out.flush()
+
+    def __call__(self, job):
+        # called from every segment worker of the job, so the throttle check is locked
+        now = time.monotonic()
+        with self._lock:
+            last_state, last_time = self._last.get(job.id, (None, 0))
+            if job.state == last_state and (job.state not in PROGRESS_STATES or now - last_time < self.interval):
+                return
+            self._last[job.id] = (job.state, now)
+
+        fields = {"job": job.id, "url": job.link, "state": job.state, "status": job.status}
+        if job.state == last_state:
+            speeds = {name: round(rate) for name, rate in job.stream_speeds.items()}
+            self.emit("progress", **fields, bytes_done=job.bytes_done, bytes_total=job.bytes_total,
+                      progress=round(job.progress, 4), speed=sum(speeds.values()), stream_speeds=speeds,
+                      **({"total_speed": round(self.limiter.throughput)} if self.limiter else {}))
+        else:
+            if job.info:
+                fields["title"] = job.info.title
+            if job.output_path:
+                fields["output"] = job.output_path
+            self.emit("state", **fields)
+
+
+def read_batch_file(path):
+    # one URL per line; blank lines and # comments are skipped, "-" reads stdin
+    f = sys.stdin if path == "-" else open(path, "r")
+    try:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m cli", description="Download YouTube videos, playlists and channels.")
+    parser.add_argument("urls", nargs="*", metavar="URL", help="video, playlist or channel URLs")
+    parser.add_argument("-a", "--batch-file", action="append", default=[], metavar="FILE",
+                        help="read URLs from FILE, one per line ('-' for stdin)")
+    parser.add_argument("-m", "--mode", choices=("both", "video", "audio"), default="both",
+                        help="download video+audio merged, video only or audio only (default: both)")
+    parser.add_argument("-f", "--format", default=DEFAULT_FORMAT, metavar="SPEC",
+                        help="stream selection, e.g. 'bestvideo[height<=720][vcodec^=avc]+bestaudio[ext=m4a]/best' "
+                             "(default: %(default)s)")
+    parser.add_argument("-o", "--output", default=DEFAULT_OUTPUT_TEMPLATE, metavar="TEMPLATE",
+                        help="output name without extension; fields: {title} {video_id} {resolution} {abr}")
+    parser.add_argument("-j", "--concurrency", type=int, default=MAX_CONCURRENT_DOWNLOADS, metavar="N",
+                        help="number of simultaneous downloads (default: %(default)s)")
+    parser.add_argument("-c", "--convert", metavar="SPEC",
+                        help="re-encode after download, e.g. 'mp3:192k', 'opus:128k' or 'mp4:h264:720p'")
+    parser.add_argument("-r", "--limit-rate", metavar="RATE",
+                        help="cap the combined download speed, e.g. '500K' or '2M' bytes per second")
+    parser.add_argument("--stream-merge", action="store_true",
+                        help="pipe downloads straight into ffmpeg instead of writing temp files")
+    parser.add_argument("--cache-file", default=METADATA_CACHE_FILE, metavar="FILE",
+                        help="on-disk metadata cache (default: %(default)s)")
+    parser.add_argument("--no-cache-file", action="store_true", help="keep the metadata cache in memory only")
+    parser.add_argument("--archive", default=DOWNLOAD_ARCHIVE_FILE, metavar="FILE",
+                        help="record finished downloads in FILE and skip videos already in it (default: %(default)s)")
+    parser.add_argument("--no-archive", action="store_true", help="download everything, even if archived")
+    parser.add_argument("--log-json", metavar="FILE",
+                        help="append structured logs (phase spans, job states) to FILE as JSON lines ('-' for stderr)")
+    parser.add_argument("--metrics-file", metavar="FILE",
+                        help=f"write Prometheus text metrics to FILE every {METRICS_FILE_INTERVAL}s and on exit")
+    parser.add_argument("--metrics-port", type=int, metavar="PORT",
+                        help="serve Prometheus text metrics on http://127.0.0.1:PORT/metrics while running")
+    parser.add_argument("--profile", metavar="DIR", help="run each job under cProfile, saving DIR/job<id>.prof")
+    parser.add_argument("-q", "--quiet", action="store_true", help="only log warnings and errors to stderr")
+    args = parser.parse_args(argv)
+
+    for path in args.batch_file:
+        args.urls.extend(read_batch_file(path))
+    if not args.urls:
+        parser.error("no URLs given")
+    try:
+        args.policy = FormatSelector(args.format)
+        args.convert = ConvertTarget.from_spec(args.convert) if args.convert else None
+        args.limit_rate = parse_rate(args.limit_rate) if args.limit_rate else None
+    except ValueError as e:
+        parser.error(str(e))
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # the engine modules report through logging; stdout is kept for the JSON lines
+    logging.basicConfig(level=logging.WARNING if args.quiet else logging.INFO, format="%(message)s",
+                        stream=sys.stderr)
+    return run(args, JsonLinesReporter(sys.stdout))
+
+
+def run(args, reporter):
+    cache = MetadataCache(disk_path=None if args.no_cache_file else args.cache_file)
+    archive = None if args.no_archive else DownloadArchive(args.archive)
+    engine = Engine(cache, max_downloads=max(1, args.concurrency), archive=archive, profile_dir=args.profile)
+    engine.limiter.rate = args.limit_rate
+    reporter.limiter = engine.limiter
+
+    metrics.configure_log(args.log_json)
+    server = metrics.serve_prometheus(args.metrics_port) if args.metrics_port else None
+    finished = threading.Event()
+    if args.metrics_file:
+        def write_metrics():
+            while not finished.wait(METRICS_FILE_INTERVAL):
+                metrics.write_prometheus(args.metrics_file)
+        threading.Thread(target=write_metrics, daemon=True, name="metrics-file").start()
+
+    def on_job(job):
+        job.listeners.append(reporter)
+
+    errors = []
+
+    def on_error(link, error):
+        errors.append(link)
+        reporter.emit("error", url=link, status=str(error))
+
+    for url in args.urls:
+        try:
+            engine.add(url, args.mode, args.policy, args.output, args.stream_merge, on_job=on_job, on_error=on_error,
+                       convert=args.convert)
+        except Exception as e:
+            on_error(url, e)
+    engine.wait()
+    cache.flush()
+
+    finished.set()
+    if args.metrics_file:
+        metrics.write_prometheus(args.metrics_file)
+    if server:
+        server.shutdown()
+    metrics.configure_log(None)
+
+    failed = [job for job in engine.jobs if job.state == FAILED]
+    reporter.emit("summary", jobs=len(engine.jobs), done=sum(job.state == DONE for job in engine.jobs),
+                  skipped=sum(job.state == SKIPPED for job in engine.jobs), failed=len(failed), errors=len(errors))
+    return 1 if failed or errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
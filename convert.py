@@ -0,0 +1,241 @@
+import functools
+import logging
+import os
+import re
+import subprocess
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# note: ffmpeg-python is imported on the first conversion to keep startup fast
+
+CPU_COUNT = os.cpu_count() or 2
+
+# each conversion is its own ffmpeg process; together they use every core
+MAX_CONCURRENT_CONVERTS = max(1, CPU_COUNT // 4)
+
+# audio targets: container -> (encoder candidates, default bitrate)
+AUDIO_FORMATS = {
+    "mp3": (("libmp3lame",), "192k"),
+    "opus": (("libopus",), "128k"),
+    "m4a": (("aac",), "192k"),
+    "ogg": (("libvorbis",), "192k"),
+}
+
+# video targets: container -> (default video codec, audio encoder candidates)
+VIDEO_FORMATS = {
+    "mp4": ("h264", ("aac",)),
+    "webm": ("vp9", ("libopus", "libvorbis")),
+    "mkv": ("h264", ("libopus", "aac")),
+}
+DEFAULT_VIDEO_AUDIO_BITRATE = "160k"
+
+# software encoders only, so any CPU-only ffmpeg build works; best candidate first
+VIDEO_CODECS = {
+    "h264": ("libx264", "libopenh264"),
+    "hevc": ("libx265",),
+    "vp9": ("libvpx-vp9",),
+    "av1": ("libsvtav1", "libaom-av1"),
+}
+
+# speed-leaning quality settings per encoder
+ENCODER_OPTIONS = {
+    "libx264": {"preset": "veryfast", "crf": 23},
+    "libx265": {"preset": "fast", "crf": 28},
+    "libvpx-vp9": {"deadline": "good", "cpu-used": 4, "row-mt": 1, "crf": 32, "b:v": 0},
+    "libsvtav1": {"preset": 8, "crf": 35},
+    "libaom-av1": {"cpu-used": 6, "row-mt": 1, "crf": 35},
+}
+
+
+class ConversionCancelled(Exception):
+    pass
+
+
+class ConvertTarget:
+    """What the convert stage produces: an audio format at a bitrate, or a video
+    container with an optional codec and maximum height.
+    """
+
+    def __init__(self, container, video_codec=None, max_height=None, audio_bitrate=None):
+        if container not in AUDIO_FORMATS and container not in VIDEO_FORMATS:
+            raise ValueError(f"Unknown convert format {container!r}")
+        if video_codec is not None and video_codec not in VIDEO_CODECS:
+            raise ValueError(f"Unknown video codec {video_codec!r}, expected one of {', '.join(VIDEO_CODECS)}")
+        self.container = container
+        self.video_codec = video_codec
+        self.max_height = max_height
+        self.audio_bitrate = audio_bitrate
+
+    @property
+    def is_audio(self):
+        return self.container in AUDIO_FORMATS
+
+    @classmethod
+    def from_spec(cls, spec):
+        """Parses "<format>[:<codec>][:<height>p][:<bitrate>k]", e.g. "mp3:320k" or "webm:vp9:480p"."""
+        container, *options = spec.strip().lower().split(":")
+        video_codec = max_height = audio_bitrate = None
+        for option in options:
+            if re.fullmatch(r"\d+k", option):
+                audio_bitrate = option
+            elif re.fullmatch(r"\d+p", option):
+                max_height = int(option[:-1])
+            else:
+                video_codec = option
+        return cls(container, video_codec, max_height, audio_bitrate)
+
+    def __str__(self):
+        if self.is_audio:
+            return f"{self.container.upper()} {self.audio_bitrate or AUDIO_FORMATS[self.container][1]}"
+        parts = [self.container.upper(), (self.video_codec or VIDEO_FORMATS[self.container][0]).upper()]
+        if self.max_height:
+            parts.append(f"≤{self.max_height}p")
+        return " ".join(parts)
+
+
+# presets offered in the GUI
+CONVERT_PRESETS = {
+    "No conversion": None,
+    "MP3 192k": ConvertTarget("mp3", audio_bitrate="192k"),
+    "MP3 320k": ConvertTarget("mp3", audio_bitrate="320k"),
+    "Opus 128k": ConvertTarget("opus", audio_bitrate="128k"),
+    "MP4 H.264 ≤720p": ConvertTarget("mp4", "h264", 720),
+    "MP4 H.264 ≤480p": ConvertTarget("mp4", "h264", 480),
+    "WebM VP9 ≤1080p": ConvertTarget("webm", "vp9", 1080),
+}
+
+
+@functools.lru_cache(maxsize=None)
+def available_encoders():
+    # names of the encoders this ffmpeg build has, or None if it can't be asked
+    try:
+        result = subprocess.run(["ffmpeg", "-hide_banner", "-encoders"], capture_output=True, text=True, timeout=30)
+    except (OSError, subprocess.SubprocessError) as e:
+        logger.warning(f"Could not list ffmpeg encoders: {e}")
+        return None
+    return frozenset(re.findall(r"^\s*[VAS][.A-Z]{5}\s+(\S+)", result.stdout, re.MULTILINE))
+
+
+def pick_encoder(candidates):
+    available = available_encoders()
+    if available is None:
+        return candidates[0]
+    for encoder in candidates:
+        if encoder in available:
+            return encoder
+    raise RuntimeError(f"ffmpeg has none of the encoders {', '.join(candidates)}")
+
+
+def media_duration(path):
+    # seconds, read from ffmpeg's input summary so ffprobe isn't required; None if unknown
+    result = subprocess.run(["ffmpeg", "-hide_banner", "-i", path], capture_output=True, text=True)
+    match = re.search(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)", result.stderr)
+    if not match:
+        return None
+    hours, minutes, seconds = match.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def output_args(target, threads):
+    # ffmpeg output options for `target`, with `threads` encoder threads per process
+    if target.is_audio:
+        encoders, default_bitrate = AUDIO_FORMATS[target.container]
+        return {"acodec": pick_encoder(encoders), "b:a": target.audio_bitrate or default_bitrate}
+
+    default_codec, audio_encoders = VIDEO_FORMATS[target.container]
+    vcodec = pick_encoder(VIDEO_CODECS[target.video_codec or default_codec])
+    args = {
+        "vcodec": vcodec,
+        "pix_fmt": "yuv420p",
+        "threads": threads,
+        "acodec": pick_encoder(audio_encoders),
+        "b:a": target.audio_bitrate or DEFAULT_VIDEO_AUDIO_BITRATE,
+        **ENCODER_OPTIONS.get(vcodec, {}),
+    }
+    if target.container == "mp4":
+        args["movflags"] = "+faststart"
+    return args
+
+
+def _progress_fraction(fields, duration):
+    if fields.get("progress") == "end":
+        return 1.0
+    # out_time_ms is in microseconds too, kept by older ffmpeg builds
+    micros = fields.get("out_time_us") or fields.get("out_time_ms")
+    if not duration or not micros or not micros.lstrip("-").isdigit():
+        return None
+    return min(1.0, max(0.0, int(micros) / 1_000_000 / duration))
+
+
+def convert_media(input_path, output_base, target, on_progress=None, cancel_event=None, threads=None):
+    """Re-encodes `input_path` to `target`, writing `<output_base>.<container>`.
+
+    ffmpeg reports through `-progress pipe:1`; on_progress(fraction) is called with every
+    update, or with None when the input duration is unknown. Setting cancel_event kills
+    ffmpeg and raises ConversionCancelled. Returns (output_path, seconds taken).
+    """
+    import ffmpeg
+
+    threads = threads or max(1, CPU_COUNT // MAX_CONCURRENT_CONVERTS)
+    output_path = f"{output_base}.{target.container}"
+    # converting a file into its own name goes through a temp file
+    if os.path.abspath(output_path) == os.path.abspath(input_path):
+        work_path = f"{output_base}.converting.{target.container}"
+    else:
+        work_path = output_path
+
+    duration = media_duration(input_path)
+    source = ffmpeg.input(input_path)
+    if target.is_audio:
+        streams = [source.audio]
+    else:
+        video = source.video
+        if target.max_height:
+            # never upscale; -2 keeps the width even, as most encoders require
+            video = video.filter("scale", -2, f"min({target.max_height},ih)")
+        streams = [video, source["a?"]]
+
+    start = time.perf_counter()
+    process = (
+        ffmpeg.output(*streams, work_path, **output_args(target, threads))
+        .global_args("-progress", "pipe:1", "-nostats", "-loglevel", "error")
+        .run_async(overwrite_output=True, pipe_stdout=True, pipe_stderr=True)
+    )
+
+    # stderr is drained on the side so a chatty ffmpeg can't block on a full pipe
+    errors = []
+    stderr_reader = threading.Thread(target=lambda: errors.extend(process.stderr), daemon=True)
+    stderr_reader.start()
+
+    fields = {}
+    cancelled = False
+    for line in process.stdout:
+        key, _, value = line.decode(errors="replace").strip().partition("=")
+        fields[key] = value
+        if key != "progress":
+            continue  # each report ends with a progress=continue|end line
+        if cancel_event is not None and cancel_event.is_set():
+            cancelled = True
+            process.kill()
+            break
+        if on_progress:
+            on_progress(_progress_fraction(fields, duration))
+
+    process.wait()
+    stderr_reader.join()
+
+    if cancelled or process.returncode != 0:
+        if os.path.exists(work_path):
+            os.remove(work_path)
+        if cancelled:
+            raise ConversionCancelled(f"Conversion of {input_path} cancelled")
+        details = b"".join(errors).decode(errors="replace").strip().splitlines()
+        raise RuntimeError(f"ffmpeg convert failed: {details[-1] if details else process.returncode}")
+
+    if work_path != output_path:
+        os.replace(work_path, output_path)
+    elapsed = time.perf_counter() - start
+    logger.info(f"Converted {input_path} to {output_path} ({target}, {threads} threads) in {elapsed:.2f}s")
+    return output_path, elapsed
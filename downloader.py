@@ -0,0 +1,450 @@
+import io
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
+
+from metrics import metrics
+from ratelimit import default_limiter
+
+logger = logging.getLogger(__name__)
+
+# note: requests and pytubefix are imported where first used, they dominate startup time
+
+# video + audio for each concurrent download the job queue allows by default; sizes the connection pool
+MAX_PARALLEL_STREAMS = 6
+
+# note: youtube throttles each connection, so large streams are split into ranged segments
+DEFAULT_SEGMENT_SIZE = 8 * 1024 * 1024
+DEFAULT_CONNECTIONS = 4
+DEFAULT_SEGMENT_RETRIES = 3
+CHUNK_SIZE = 64 * 1024
+REQUEST_TIMEOUT = 30
+
+# unfinished downloads keep their data in <file>.part and their progress in <file>.part.json
+PART_SUFFIX = ".part"
+MANIFEST_SUFFIX = ".part.json"
+
+
+class DownloadCancelled(Exception):
+    pass
+
+
+class RangeNotSupported(Exception):
+    pass
+
+
+class _LinkedEvent:
+    """Cancel flag for a group of transfers, also set whenever the caller's `parent` is.
+
+    Setting it stops the group without touching the parent, so a failed segment or
+    stream aborts its siblings while the caller's (e.g. a job's) cancel event stays
+    clear for fallbacks and retries.
+    """
+
+    def __init__(self, parent=None):
+        self.parent = parent
+        self._event = threading.Event()
+
+    def set(self):
+        self._event.set()
+
+    def is_set(self):
+        return self._event.is_set() or (self.parent is not None and self.parent.is_set())
+
+
+def create_session(pool_size=MAX_PARALLEL_STREAMS * DEFAULT_CONNECTIONS):
+    # keep-alive session whose connection pool fits every segment worker at once
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class CombinedProgress:
+    """Sums downloaded bytes across several concurrent streams into one progress value."""
+
+    def __init__(self, totals, callback):
+        self.totals = dict(totals)
+        self.done = {key: 0 for key in self.totals}
+        self.callback = callback
+        self._lock = threading.Lock()
+
+    @property
+    def total(self):
+        return sum(self.totals.values())
+
+    def update(self, key, nbytes):
+        with self._lock:
+            self.done[key] += nbytes
+            done = sum(self.done.values())
+        if self.callback:
+            self.callback(done, self.total)
+
+
+class PartialDownload:
+    """The `.part` file of an unfinished segmented download plus its sidecar manifest.
+
+    The manifest records the stream itag, total size, segment size and a CRC32 for every
+    completed segment, so a later download of the same stream can verify what is already
+    on disk and only request the missing ranges.
+    """
+
+    def __init__(self, file_path, itag, total_size, segment_size):
+        self.file_path = file_path
+        self.part_path = file_path + PART_SUFFIX
+        self.manifest_path = file_path + MANIFEST_SUFFIX
+        self.itag = itag
+        self.total_size = total_size
+        self.segment_size = segment_size
+        self.completed = {}  # segment start -> (segment end, crc32)
+        self._lock = threading.Lock()
+
+    def open(self, on_chunk=None):
+        # resumes a matching partial download or starts a new one; returns the bytes reused
+        if self._load_manifest():
+            resumed = self._verify(on_chunk)
+            if resumed:
+                logger.info(f"Resuming {self.file_path} with {resumed} of {self.total_size} bytes on disk")
+            self._save_manifest()
+            return resumed
+
+        with open(self.part_path, "wb") as fh:
+            fh.truncate(self.total_size)
+        self.completed = {}
+        self._save_manifest()
+        return 0
+
+    def mark_complete(self, start, end, crc):
+        with self._lock:
+            self.completed[start] = (end, crc)
+        self._save_manifest()
+
+    def finish(self):
+        os.replace(self.part_path, self.file_path)
+        if os.path.exists(self.manifest_path):
+            os.remove(self.manifest_path)
+
+    def discard(self):
+        for path in (self.part_path, self.manifest_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _load_manifest(self):
+        if not (os.path.exists(self.manifest_path) and os.path.exists(self.part_path)):
+            return False
+        try:
+            with open(self.manifest_path, "r") as f:
+                manifest = json.load(f)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable manifest {self.manifest_path}: {e}")
+            return False
+
+        if (manifest.get("itag") != self.itag
+                or manifest.get("total_size") != self.total_size
+                or manifest.get("segment_size") != self.segment_size
+                or os.path.getsize(self.part_path) != self.total_size):
+            return False
+
+        self.completed = {int(start): (end, crc) for start, (end, crc) in manifest["completed"].items()}
+        return True
+
+    def _verify(self, on_chunk):
+        # drops every completed segment whose data no longer matches its checksum
+        resumed = 0
+        with open(self.part_path, "rb") as fh:
+            for start, (end, crc) in list(self.completed.items()):
+                fh.seek(start)
+                actual = 0
+                remaining = end - start + 1
+                while remaining > 0:
+                    chunk = fh.read(min(CHUNK_SIZE, remaining))
+                    if not chunk:
+                        break
+                    actual = zlib.crc32(chunk, actual)
+                    remaining -= len(chunk)
+                if remaining or actual != crc:
+                    logger.warning(f"Segment {start}-{end} of {self.part_path} failed verification, refetching")
+                    del self.completed[start]
+                    continue
+                resumed += end - start + 1
+                if on_chunk:
+                    on_chunk(end - start + 1)
+        return resumed
+
+    def _save_manifest(self):
+        with self._lock:
+            manifest = {
+                "itag": self.itag,
+                "total_size": self.total_size,
+                "segment_size": self.segment_size,
+                "completed": {str(start): [end, crc] for start, (end, crc) in self.completed.items()},
+            }
+            tmp_path = f"{self.manifest_path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(manifest, f)
+            os.replace(tmp_path, self.manifest_path)
+
+
+class SegmentedDownloader:
+    """Downloads a URL as byte-range segments over several pooled keep-alive connections.
+
+    The data goes to a preallocated `.part` file and every segment is written at its own
+    offset, so segments may complete in any order. A failed segment is retried from the
+    last byte it wrote, up to `retries` times. Completed segments are recorded in a
+    manifest next to the `.part` file, which lets an interrupted download resume later;
+    the file is only renamed into place once every segment is on disk.
+
+    Received bytes pass through a ratelimit.Flow of `limiter` (the process-wide one by
+    default); callers pass their own flow to set a priority and read its throughput.
+    """
+
+    def __init__(self, segment_size=DEFAULT_SEGMENT_SIZE, connections=DEFAULT_CONNECTIONS,
+                 retries=DEFAULT_SEGMENT_RETRIES, session=None, timeout=REQUEST_TIMEOUT, limiter=None):
+        self.segment_size = segment_size
+        self.connections = connections
+        self.retries = retries
+        self.timeout = timeout
+        self.limiter = limiter or default_limiter
+        self._session = session
+        self._session_lock = threading.Lock()
+
+    @property
+    def session(self):
+        # created on first download rather than when the module is imported
+        with self._session_lock:
+            if self._session is None:
+                self._session = create_session()
+            return self._session
+
+    def segments(self, total_size):
+        return [
+            (start, min(start + self.segment_size, total_size) - 1)
+            for start in range(0, total_size, self.segment_size)
+        ]
+
+    def download(self, url, file_path, total_size, on_chunk=None, cancel_event=None, itag=None, flow=None):
+        # on_chunk receives the size of every chunk written, from the segment worker threads
+        aborted = _LinkedEvent(cancel_event)
+        flow = flow or self.limiter.flow()
+
+        if os.path.isfile(file_path) and os.path.getsize(file_path) == total_size:
+            logger.info(f"{file_path} already downloaded, skipping")
+            if on_chunk:
+                on_chunk(total_size)
+            return file_path
+
+        partial = PartialDownload(file_path, itag, total_size, self.segment_size)
+        partial.open(on_chunk)
+
+        with ThreadPoolExecutor(max_workers=self.connections, thread_name_prefix="segment") as pool:
+            futures = [
+                pool.submit(self._download_segment, url, partial, start, end, on_chunk, aborted, flow)
+                for start, end in self.segments(total_size)
+                if start not in partial.completed
+            ]
+            done, pending = wait(futures, return_when=FIRST_EXCEPTION)
+            if any(f.exception() for f in done):
+                aborted.set()
+                wait(pending)
+
+        errors = [f.exception() for f in futures if f.exception()]
+        errors.sort(key=lambda e: isinstance(e, DownloadCancelled))
+        if errors:
+            if isinstance(errors[0], RangeNotSupported):
+                # nothing resumable was written, the caller falls back to a sequential download
+                partial.discard()
+            raise errors[0]
+        partial.finish()
+        return file_path
+
+    def download_any(self, stream, file_path, on_chunk=None, cancel_event=None, flow=None):
+        # segmented when the size is known and the server honours ranges, sequential otherwise
+        flow = flow or self.limiter.flow()
+        received = flow.bytes
+        with metrics.span("download", itag=stream.itag, path=file_path) as span:
+            try:
+                total_size = stream.filesize
+                if total_size:
+                    try:
+                        return self.download(stream.url, file_path, total_size, on_chunk, cancel_event,
+                                             itag=stream.itag, flow=flow)
+                    except RangeNotSupported:
+                        logger.warning(f"Server ignored range requests for itag {stream.itag}, downloading sequentially")
+                return download_stream(stream, file_path, on_chunk, cancel_event, flow=flow)
+            finally:
+                # bytes that came over the network, not those resumed from a .part file
+                span["bytes"] = flow.bytes - received
+
+    def iter_segments(self, url, total_size, on_chunk=None, cancel_event=None, flow=None):
+        """Yields the content of `url` in order, one segment at a time.
+
+        Up to `connections` segments are fetched ahead of the consumer, so memory stays
+        bounded by roughly (connections + 1) * segment_size however large the stream is.
+        """
+        cancel_event = cancel_event or threading.Event()
+        flow = flow or self.limiter.flow()
+        stopped = threading.Event()  # set when the consumer stops early, without cancelling siblings
+
+        def is_cancelled():
+            return cancel_event.is_set() or stopped.is_set()
+
+        segments = iter(self.segments(total_size))
+        window = deque()
+        with ThreadPoolExecutor(max_workers=self.connections, thread_name_prefix="segment") as pool:
+            def submit_next():
+                segment = next(segments, None)
+                if segment:
+                    window.append(pool.submit(
+                        self._segment_bytes, url, *segment, total_size, on_chunk, is_cancelled, flow))
+
+            try:
+                for _ in range(self.connections):
+                    submit_next()
+                while window:
+                    data = window.popleft().result()
+                    submit_next()
+                    yield data
+            finally:
+                stopped.set()
+
+    def iter_stream(self, stream, on_chunk=None, cancel_event=None, flow=None):
+        # ordered chunks of a pytubefix stream: segmented when possible, sequential otherwise
+        flow = flow or self.limiter.flow()
+        total_size = stream.filesize
+        if total_size:
+            yielded = False
+            try:
+                for data in self.iter_segments(stream.url, total_size, on_chunk, cancel_event, flow):
+                    yielded = True
+                    yield data
+                return
+            except RangeNotSupported:
+                if yielded:
+                    raise
+                logger.warning(f"Server ignored range requests for itag {stream.itag}, streaming sequentially")
+
+        from pytubefix import request
+
+        for chunk in request.stream(stream.url):
+            if cancel_event is not None and cancel_event.is_set():
+                raise DownloadCancelled(f"Download of itag {stream.itag} cancelled")
+            flow.consume(len(chunk), cancel_event.is_set if cancel_event else None)
+            if on_chunk:
+                on_chunk(len(chunk))
+            yield chunk
+
+    def _download_segment(self, url, partial, start, end, on_chunk, cancel_event, flow):
+        with open(partial.part_path, "r+b") as fh:
+            crc = self._fetch_segment(url, start, end, partial.total_size, fh, 0, on_chunk, cancel_event.is_set, flow)
+        partial.mark_complete(start, end, crc)
+
+    def _segment_bytes(self, url, start, end, total_size, on_chunk, is_cancelled, flow):
+        buffer = io.BytesIO()
+        self._fetch_segment(url, start, end, total_size, buffer, start, on_chunk, is_cancelled, flow)
+        return buffer.getvalue()
+
+    def _fetch_segment(self, url, start, end, total_size, sink, base, on_chunk, is_cancelled, flow):
+        # writes bytes start..end into `sink` at position (offset - base) and returns their crc32;
+        # state tracks the bytes already written, so a retry resumes after them
+        state = {"written": 0, "crc": 0}
+        attempt = 0
+        while True:
+            try:
+                self._fetch_range(url, start, end, total_size, sink, base, state, on_chunk, is_cancelled, flow)
+                return state["crc"]
+            except (DownloadCancelled, RangeNotSupported):
+                raise
+            except Exception as e:
+                attempt += 1
+                if attempt > self.retries:
+                    raise
+                logger.warning(f"Segment {start}-{end} failed ({e}), retrying ({attempt}/{self.retries})")
+                time.sleep(min(2 ** attempt * 0.25, 4))
+
+    def _fetch_range(self, url, start, end, total_size, sink, base, state, on_chunk, is_cancelled, flow):
+        offset = start + state["written"]
+        headers = {"Range": f"bytes={offset}-{end}"}
+        with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+            response.raise_for_status()
+            if response.status_code != 206 and not (offset == 0 and end == total_size - 1):
+                raise RangeNotSupported(url)
+
+            sink.seek(offset - base)
+            for chunk in response.iter_content(CHUNK_SIZE):
+                if is_cancelled():
+                    raise DownloadCancelled(f"Segment {start}-{end} cancelled")
+                flow.consume(len(chunk), is_cancelled)
+                sink.write(chunk)
+                state["written"] += len(chunk)
+                state["crc"] = zlib.crc32(chunk, state["crc"])
+                if on_chunk:
+                    on_chunk(len(chunk))
+
+        if start + state["written"] != end + 1:
+            raise IOError(f"Segment {start}-{end} ended after {state['written']} bytes")
+
+
+default_downloader = SegmentedDownloader()
+
+
+def download_stream(stream, file_path, on_chunk=None, cancel_event=None, timeout=None, max_retries=0, flow=None):
+    # sequential single-connection download; on_chunk receives the size of every chunk written
+    from pytubefix import request
+
+    flow = flow or default_limiter.flow()
+    with open(file_path, "wb") as fh:
+        for chunk in request.stream(stream.url, timeout=timeout, max_retries=max_retries):
+            if cancel_event is not None and cancel_event.is_set():
+                raise DownloadCancelled(f"Download of itag {stream.itag} cancelled")
+            flow.consume(len(chunk), cancel_event.is_set if cancel_event else None)
+            fh.write(chunk)
+            if on_chunk:
+                on_chunk(len(chunk))
+    return file_path
+
+
+def download_parallel(downloads, on_progress=None, cancel_event=None, downloader=None, flows=None):
+    """Downloads several streams at once, one worker thread each.
+
+    `downloads` is a list of (stream, file_path) pairs and `on_progress` receives
+    (bytes_done, bytes_total) summed over all of them; `flows` optionally gives each
+    its ratelimit.Flow. The first failure cancels the remaining transfers and is
+    re-raised; returns the file paths in input order.
+    """
+    downloader = downloader or default_downloader
+    aborted = _LinkedEvent(cancel_event)
+    progress = CombinedProgress({i: stream.filesize for i, (stream, _) in enumerate(downloads)}, on_progress)
+
+    # its own workers, so however many jobs download at once none waits for a shared pool
+    with ThreadPoolExecutor(max_workers=len(downloads), thread_name_prefix="stream-download") as pool:
+        futures = [
+            pool.submit(
+                downloader.download_any, stream, file_path,
+                on_chunk=lambda nbytes, i=i: progress.update(i, nbytes),
+                cancel_event=aborted,
+                flow=flows[i] if flows else None,
+            )
+            for i, (stream, file_path) in enumerate(downloads)
+        ]
+
+        done, pending = wait(futures, return_when=FIRST_EXCEPTION)
+        if any(f.exception() for f in done):
+            # stop the other workers before surfacing the error
+            aborted.set()
+            wait(pending)
+
+    errors = [f.exception() for f in futures if f.exception()]
+    # report the root cause rather than the cancellations it triggered
+    errors.sort(key=lambda e: isinstance(e, DownloadCancelled))
+    if errors:
+        raise errors[0]
+    return [f.result() for f in futures]
@@ -0,0 +1,122 @@
+"""GUI-free download engine shared by the desktop app and the command line.
+
+Nothing here imports customtkinter or PIL, so it can run on servers and be used as a
+library:
+
+    engine = Engine()
+    engine.add("https://youtu.be/...", policy=FormatSelector("bestvideo[height<=1080]+bestaudio/best"))
+    engine.wait()
+
+Diagnostics go through the logging module, one logger per module (e.g. "jobs",
+"downloader"); nothing is printed.
+"""
+import logging
+import threading
+
+from jobs import (
+    MAX_CONCURRENT_DOWNLOADS, MAX_CONCURRENT_FETCHES, MAX_CONCURRENT_MERGES, DownloadJob, JobScheduler,
+)
+from metadata_cache import MetadataCache, sort_streams
+from metrics import metrics
+from playlists import collection_kind, iter_collection, prefetch_metadata
+
+logger = logging.getLogger(__name__)
+
+METADATA_CACHE_FILE = "metadata_cache.json"
+DOWNLOAD_ARCHIVE_FILE = "download_archive.jsonl"
+
+
+class Engine:
+    def __init__(self, cache=None, max_fetches=MAX_CONCURRENT_FETCHES, max_downloads=MAX_CONCURRENT_DOWNLOADS,
+                 max_merges=MAX_CONCURRENT_MERGES, downloader=None, archive=None, profile_dir=None):
+        self.cache = cache or MetadataCache()
+        # archive.DownloadArchive; jobs already in it finish as skipped without touching the network
+        self.archive = archive
+        self.scheduler = JobScheduler(self.cache, max_fetches, max_downloads, max_merges, downloader, archive=archive,
+                                      profile_dir=profile_dir)
+
+        metrics.gauge("jobs_active", lambda: sum(not job.finished for job in self.jobs), "jobs not yet finished")
+        metrics.gauge("transfer_bytes_per_second", lambda: round(self.limiter.throughput),
+                      "combined speed of every transfer")
+        metrics.gauge("rate_limit_bytes_per_second", lambda: self.limiter.rate or 0, "bandwidth cap, 0 for none")
+
+    @property
+    def jobs(self):
+        return self.scheduler.jobs
+
+    @property
+    def limiter(self):
+        # the bandwidth cap every transfer shares; set limiter.rate (bytes/s, None = no cap) at any time
+        return self.scheduler.downloader.limiter
+
+    def fetch(self, link):
+        # metadata for one video, served from the cache when already resolved
+        with metrics.span("fetch", url=link):
+            return self.cache.resolve(link)
+
+    def streams(self, link):
+        # (video streams, audio streams) ranked best first
+        info = self.fetch(link)
+        return sort_streams(info.video_streams), sort_streams(info.audio_streams)
+
+    def submit(self, job):
+        return self.scheduler.submit(job)
+
+    def add(self, link, choice="both", policy=None, output_template=None, stream_merge=False,
+            on_job=None, on_error=None, cancel_event=None, convert=None):
+        """Queues a video, playlist or channel URL and returns the jobs created.
+
+        Playlist and channel entries are prefetched concurrently and each is queued as
+        soon as its metadata has resolved, so this blocks until the expansion is done.
+        on_job(job) runs right before a job is submitted (attach listeners there), and
+        on_error(link, error) for entries whose metadata could not be resolved.
+        """
+        options = dict(choice=choice, policy=policy, output_template=output_template, stream_merge=stream_merge,
+                       convert=convert)
+
+        if not collection_kind(link):
+            job = DownloadJob(link, **options)
+            if on_job:
+                on_job(job)
+            return [self.submit(job)]
+
+        jobs = []
+        pending = {}  # entry link -> its jobs waiting for metadata (playlists may repeat a video)
+        lock = threading.Lock()
+
+        def queue(job):
+            if on_job:
+                on_job(job)
+            with lock:
+                jobs.append(job)
+            self.submit(job)
+
+        def on_result(entry_link, info, error):
+            if error:
+                with lock:
+                    pending[entry_link].pop(0)
+                logger.warning(f"Skipping {entry_link}: {error}")
+                if on_error:
+                    on_error(entry_link, error)
+                return
+            with lock:
+                job = pending[entry_link].pop(0)
+            job.info = info
+            queue(job)
+
+        def unarchived(links):
+            # archived entries are queued straight away (and skip), the rest get their metadata prefetched
+            for entry_link in links:
+                job = DownloadJob(entry_link, **options)
+                if self.scheduler.archived(job) is not None:
+                    queue(job)
+                else:
+                    with lock:
+                        pending.setdefault(entry_link, []).append(job)
+                    yield entry_link
+
+        prefetch_metadata(unarchived(iter_collection(link)), self.cache, on_result, cancel_event=cancel_event)
+        return jobs
+
+    def wait(self):
+        self.scheduler.wait()
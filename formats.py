@@ -0,0 +1,243 @@
+"""Declarative stream selection, e.g. "bestvideo[height<=1080][vcodec^=avc]+bestaudio[ext=m4a]/best".
+
+A spec is a list of alternatives separated by "/", tried left to right. Each
+alternative is a video selector, an audio selector, or both joined by "+":
+
+    bestvideo, bv, worstvideo, wv     video streams
+    bestaudio, ba, worstaudio, wa     audio streams
+    best, b, worst, w                 a video + audio pair (streams are always separate)
+
+followed by any number of filters:
+
+    [height<=1080] [fps>30] [abr>=128] [filesize<50M] [itag=137]   numbers: = != < <= > >=
+    [ext=mp4] [vcodec^=avc] [acodec=opus] [vcodec*=vp]             text: = != ^= $= *=
+    [hdr] [hdr=false]                                               flags
+    [height<=?1080]                                                 "?" also passes streams without the value
+
+Filters on best/worst apply to the video stream, except the audio-only keys (abr,
+acodec). A side an alternative leaves open is filled with the best stream; the audio
+side always prefers streams the video can be remuxed with, so merging never transcodes.
+Specs are parsed once, and the stream attributes are parsed once per stream
+(StreamInfo.attrs), so selecting across thousands of playlist entries stays cheap.
+"""
+import re
+
+from mux import choose_container
+
+# stream attributes filters can use, by kind
+VIDEO_KEYS = {"height", "fps", "vcodec", "hdr"}
+AUDIO_KEYS = {"abr", "acodec"}
+COMMON_KEYS = {"ext", "filesize", "itag"}
+NUMERIC_KEYS = {"height", "fps", "abr", "filesize", "itag"}
+TEXT_KEYS = {"ext", "vcodec", "acodec"}
+FLAG_KEYS = {"hdr"}
+
+NUMERIC_OPS = {
+    "=": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+}
+TEXT_OPS = {
+    "=": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "^=": lambda a, b: a.startswith(b),
+    "$=": lambda a, b: a.endswith(b),
+    "*=": lambda a, b: b in a,
+}
+
+SELECTORS = {
+    # name: (kind, worst)
+    "bestvideo": ("video", False), "bv": ("video", False),
+    "worstvideo": ("video", True), "wv": ("video", True),
+    "bestaudio": ("audio", False), "ba": ("audio", False),
+    "worstaudio": ("audio", True), "wa": ("audio", True),
+    "best": ("pair", False), "b": ("pair", False),
+    "worst": ("pair", True), "w": ("pair", True),
+}
+
+# most efficient codec first; the best stream wins on quality before codec is considered
+VIDEO_CODEC_PREFERENCE = ("av01", "vp09", "vp9", "hev1", "hvc1", "avc1")
+AUDIO_CODEC_PREFERENCE = ("opus", "mp4a", "vorbis")
+
+SIZE_UNITS = {"": 1, "k": 1024, "m": 1024 ** 2, "g": 1024 ** 3}
+
+_FILTER_RE = re.compile(r"\[\s*(\w+)\s*(?:(<=|>=|!=|\^=|\$=|\*=|<|>|=)\s*(\?)?\s*([^\]]*?))?\s*\]")
+
+
+def _codec_preference(codec, preference):
+    for score, prefix in enumerate(reversed(preference)):
+        if codec.startswith(prefix):
+            return score + 1
+    return 0
+
+
+def stream_rank(attrs):
+    """Sort key over StreamInfo.attrs, higher is better.
+
+    Video: height, fps, HDR, codec efficiency, then size as a stand-in for bitrate.
+    Audio: bitrate, codec, size.
+    """
+    if attrs["kind"] == "video":
+        return (attrs["height"] or 0, attrs["fps"] or 0, attrs["hdr"],
+                _codec_preference(attrs["vcodec"], VIDEO_CODEC_PREFERENCE), attrs["filesize"] or 0)
+    return (attrs["abr"] or 0, _codec_preference(attrs["acodec"], AUDIO_CODEC_PREFERENCE), attrs["filesize"] or 0)
+
+
+def remux_compatible(video, audio):
+    # True if the pair fits webm or mp4 without re-encoding (anything fits mkv)
+    return choose_container(video.video_codec, audio.audio_codec)[0] != "mkv"
+
+
+def _parse_number(key, text):
+    text = text.strip().lower()
+    if key == "filesize":
+        match = re.fullmatch(r"(\d+(?:\.\d+)?)\s*([kmg]?)i?b?", text)
+        if match:
+            return float(match.group(1)) * SIZE_UNITS[match.group(2)]
+    else:
+        # 1080p, 128k, 128kbps and 60fps read as their number
+        match = re.fullmatch(r"(\d+(?:\.\d+)?)\s*(p|k|kbps|fps)?", text)
+        if match:
+            return float(match.group(1))
+    raise ValueError(f"Invalid number {text!r} for {key}")
+
+
+class _Filter:
+    def __init__(self, key, op, value, optional):
+        self.key = key
+        self.optional = optional
+        if key in FLAG_KEYS:
+            if op not in (None, "=", "!="):
+                raise ValueError(f"{key} only supports = and !=")
+            flag = value is None or value.strip().lower() in ("", "1", "true", "yes")
+            self.test = (lambda v: v == flag) if op != "!=" else (lambda v: v != flag)
+        elif op is None:
+            raise ValueError(f"Filter [{key}] needs a comparison, e.g. [{key}=...]")
+        elif key in NUMERIC_KEYS:
+            if op not in NUMERIC_OPS:
+                raise ValueError(f"Operator {op} does not apply to numbers ({key})")
+            compare, number = NUMERIC_OPS[op], _parse_number(key, value)
+            self.test = lambda v: compare(v, number)
+        else:
+            if op not in TEXT_OPS:
+                raise ValueError(f"Operator {op} does not apply to text ({key})")
+            compare, text = TEXT_OPS[op], value.strip().lower()
+            self.test = lambda v: compare(v, text)
+
+    def __call__(self, attrs):
+        value = attrs.get(self.key)
+        if value is None or value == "":
+            return self.optional
+        return self.test(value)
+
+
+class _Selector:
+    def __init__(self, kind, worst, filters):
+        self.kind = kind
+        self.worst = worst
+        self.filters = filters
+
+    def pick(self, streams, video=None):
+        # best (or worst) stream passing every filter; audio prefers a remux-compatible match for `video`
+        candidates = [s for s in streams if all(f(s.attrs) for f in self.filters)]
+        if not candidates:
+            return None
+
+        def key(stream):
+            rank = stream.attrs["rank"]
+            if self.worst:
+                rank = tuple(-value for value in rank)
+            return (remux_compatible(video, stream), rank) if video is not None else rank
+
+        return max(candidates, key=key)
+
+
+def _split(spec, separator):
+    # splits on separator outside of [...] filters
+    parts, depth, current = [], 0, ""
+    for char in spec:
+        depth += (char == "[") - (char == "]")
+        if char == separator and depth == 0:
+            parts.append(current)
+            current = ""
+        else:
+            current += char
+    parts.append(current)
+    return parts
+
+
+def _parse_part(text):
+    match = re.match(r"\s*(\w*)", text)
+    name = match.group(1) or "best"
+    if name not in SELECTORS:
+        raise ValueError(f"Unknown selector {name!r}, expected one of {', '.join(SELECTORS)}")
+    kind, worst = SELECTORS[name]
+
+    rest = text[match.end():].strip()
+    filters = []
+    while rest:
+        filter_match = _FILTER_RE.match(rest)
+        if not filter_match:
+            raise ValueError(f"Invalid filter {rest!r}")
+        key, op, optional, value = filter_match.groups()
+        allowed = {"video": VIDEO_KEYS | COMMON_KEYS, "audio": AUDIO_KEYS | COMMON_KEYS}.get(kind)
+        if key not in (allowed or VIDEO_KEYS | AUDIO_KEYS | COMMON_KEYS):
+            raise ValueError(f"Unknown {kind} filter key {key!r}")
+        filters.append(_Filter(key, op, value, bool(optional)))
+        rest = rest[filter_match.end():].strip()
+
+    if kind != "pair":
+        return [_Selector(kind, worst, filters)]
+    # best/worst: audio-only keys filter the audio side, everything else the video side
+    return [
+        _Selector("video", worst, [f for f in filters if f.key not in AUDIO_KEYS]),
+        _Selector("audio", worst, [f for f in filters if f.key in AUDIO_KEYS]),
+    ]
+
+
+class FormatSelector:
+    """A parsed format spec (see the module docstring); pick pairs with select()."""
+
+    def __init__(self, spec):
+        self.spec = spec.strip()
+        if not self.spec:
+            raise ValueError("Empty format spec")
+        self.alternatives = []
+        for alternative in _split(self.spec, "/"):
+            sides = {}
+            for part in _split(alternative, "+"):
+                for selector in _parse_part(part):
+                    if selector.kind in sides:
+                        raise ValueError(f"{alternative.strip()!r} selects {selector.kind} twice")
+                    sides[selector.kind] = selector
+            self.alternatives.append(sides)
+
+    def __str__(self):
+        return self.spec
+
+    def select(self, video_streams, audio_streams, choice="both", video=None):
+        """Returns (video, audio) for the first alternative that matches.
+
+        `choice` is "both", "video" or "audio"; the side it doesn't need is None. A
+        `video` picked by hand is kept and only the audio is selected for it.
+        Raises ValueError if no alternative matches.
+        """
+        default = _Selector(None, False, [])
+        for sides in self.alternatives:
+            picked_video = picked_audio = None
+            if choice in ("video", "both"):
+                picked_video = video or sides.get("video", default).pick(video_streams)
+                if picked_video is None:
+                    continue
+            if choice in ("audio", "both"):
+                picked_audio = sides.get("audio", default).pick(audio_streams, picked_video)
+                if picked_audio is None:
+                    continue
+            return picked_video, picked_audio
+        raise ValueError(f"No streams match format {self.spec!r}")
+
+
+DEFAULT_FORMAT = "bestvideo[height<=1080][ext=mp4]+bestaudio[ext=m4a]/bestvideo+bestaudio"
@@ -0,0 +1,523 @@
+import collections
+import itertools
+import logging
+import os
+import re
+import threading
+from contextlib import contextmanager
+
+from downloader import (
+    MANIFEST_SUFFIX, PART_SUFFIX, CombinedProgress, DownloadCancelled, default_downloader, download_parallel,
+)
+from convert import CPU_COUNT, MAX_CONCURRENT_CONVERTS, ConversionCancelled, convert_media
+from formats import DEFAULT_FORMAT, FormatSelector
+from metadata_cache import canonical_video_id
+from metrics import metrics
+from ratelimit import PRIORITY_NORMAL
+from mux import merge_streams, stream_merge, streaming_supported
+
+logger = logging.getLogger(__name__)
+
+# fetches and downloads are network bound, merges are CPU/disk bound, so each gets its own cap
+MAX_CONCURRENT_FETCHES = 4
+MAX_CONCURRENT_DOWNLOADS = 3
+MAX_CONCURRENT_MERGES = max(1, (os.cpu_count() or 2) // 2)
+# how often a job waiting for a slot checks whether it was paused or cancelled
+SLOT_WAIT_INTERVAL = 0.2
+
+# job states
+QUEUED = "queued"
+WAITING = "waiting"  # for a free fetch, download, merge or convert slot
+FETCHING = "fetching"
+DOWNLOADING = "downloading"
+MERGING = "merging"
+CONVERTING = "converting"
+PAUSED = "paused"
+DONE = "done"
+SKIPPED = "skipped"  # already in the download archive
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINISHED_STATES = (DONE, SKIPPED, FAILED, CANCELLED)
+PROGRESS_STATES = (DOWNLOADING, CONVERTING)  # states that report a progress fraction
+
+# fields: title, video_id, resolution, abr; may include directories, e.g. "downloads/{video_id} {title}"
+DEFAULT_OUTPUT_TEMPLATE = "{title}"
+
+
+def clean_filename(title: str) -> str:
+    """Removes invalid characters and shortens long titles for file safety."""
+    safe_title = re.sub(r'[^\w\s-]', '', title).strip()
+    safe_title = re.sub(r'\s+', ' ', safe_title)
+    return safe_title[:100]
+
+
+def render_output_name(template, info, video=None, audio=None):
+    # output path without extension; directories in the template are created on the way
+    name = (template or DEFAULT_OUTPUT_TEMPLATE).format(
+        title=clean_filename(info.title) or "output",
+        video_id=info.video_id,
+        resolution=video.resolution if video else "",
+        abr=audio.abr if audio else "",
+    )
+    directory = os.path.dirname(name)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    return name
+
+
+# presets offered in the GUI; any format spec (see formats.py) can be typed instead
+QUALITY_PRESETS = {
+    "Best available": FormatSelector("bestvideo+bestaudio"),
+    "Best MP4 ≤1080p + M4A": FormatSelector(DEFAULT_FORMAT),
+    "Best MP4 ≤720p + M4A": FormatSelector("bestvideo[height<=720][ext=mp4]+bestaudio[ext=m4a]/bestvideo+bestaudio"),
+    "Best WebM + Opus": FormatSelector("bestvideo[ext=webm]+bestaudio[acodec=opus]/bestvideo+bestaudio"),
+}
+
+
+class DownloadJob:
+    """One URL to download, with its own streams, paths, progress and state.
+
+    `choice` is "video", "audio" or "both". Streams left as None are picked by
+    `policy`, a formats.FormatSelector, once the metadata has been fetched, and
+    without an `output_name` the file is named from `output_template`. With a
+    `convert` target (convert.ConvertTarget) the downloaded file is re-encoded last.
+    `priority` weighs the job's share of a capped bandwidth (see ratelimit).
+    Listeners are called with the job, from worker threads, whenever its state or
+    progress changes.
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, link, choice="both", output_name=None, video=None, audio=None, stream_merge=False,
+                 policy=None, output_template=None, convert=None, priority=PRIORITY_NORMAL):
+        self.id = next(self._ids)
+        self.link = link
+        self.choice = choice
+        self.output_name = output_name
+        self.video = video
+        self.audio = audio
+        self.stream_merge = stream_merge
+        self.policy = policy or FormatSelector(DEFAULT_FORMAT)
+        self.output_template = output_template
+        self.convert = convert
+        self.priority = priority
+        # what the download archive keys the result by, next to the video ID
+        streams = "+".join(str(s.itag) for s in (video, audio) if s) or str(self.policy)
+        self.archive_format = f"{choice}|{streams}|{convert or ''}"
+
+        self.info = None
+        self.state = QUEUED
+        self.status = "Queued"
+        self.error = None
+        self.output_path = None
+        self.merge_seconds = None
+        self.convert_seconds = None
+        self.bytes_done = 0
+        self.bytes_total = 0
+        self.convert_progress = 0
+
+        self.cancel_event = threading.Event()
+        self.listeners = []
+        self._pause_requested = False
+        self._thread = None  # set once the scheduler starts the job
+        self._start_lock = threading.Lock()  # orders pause and cancel against the job being started
+        self._video_stream = None
+        self._audio_stream = None
+        self._partial_paths = []  # downloads whose .part files belong to this job
+        self._flows = {}  # stream name -> ratelimit.Flow of the current transfer
+
+    @property
+    def title(self):
+        return self.info.title if self.info else self.link
+
+    @property
+    def progress(self):
+        if self.state == CONVERTING:
+            return self.convert_progress
+        return self.bytes_done / self.bytes_total if self.bytes_total else 0
+
+    @property
+    def speed(self):
+        # bytes per second over all of the job's streams
+        return sum(self.stream_speeds.values())
+
+    @property
+    def stream_speeds(self):
+        return {name: flow.rate for name, flow in list(self._flows.items())}
+
+    @property
+    def finished(self):
+        return self.state in FINISHED_STATES
+
+    def set_priority(self, priority):
+        # takes effect right away, also for a transfer in progress
+        self.priority = priority
+        for flow in list(self._flows.values()):
+            flow.priority = priority
+
+    def pause(self):
+        # stops the transfer but keeps the .part files, so resuming continues where it left off
+        if not self.finished and self.state != PAUSED:
+            with self._start_lock:
+                self._pause_requested = True
+                self.cancel_event.set()
+                if self._thread is None:
+                    self._set_state(PAUSED, "Paused")
+
+    def cancel(self):
+        if self.state == PAUSED:
+            # nothing is running, so the job is finished off right here
+            self._discard_partials()
+            self._set_state(CANCELLED, "Cancelled")
+        elif not self.finished:
+            with self._start_lock:
+                self._pause_requested = False
+                self.cancel_event.set()
+                if self._thread is None:
+                    # still queued: the scheduler skips it
+                    self._set_state(CANCELLED, "Cancelled")
+
+    def _discard_partials(self):
+        # a cancelled job won't be resumed, so its downloads are removed: unfinished ones, finished
+        # temp streams and files a sequential fallback wrote in place
+        for path in self._partial_paths:
+            for leftover in (path, path + PART_SUFFIX, path + MANIFEST_SUFFIX):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+        self._partial_paths = []
+
+    def _check_cancelled(self):
+        if self.cancel_event.is_set():
+            raise DownloadCancelled(f"Job {self.id} stopped")
+
+    def _set_state(self, state, status):
+        self.state = state
+        self.status = status
+        logger.info(f"[job {self.id}] {status}")
+        metrics.log("job_state", job=self.id, url=self.link, state=state, status=status)
+        if state in FINISHED_STATES:
+            metrics.inc("jobs_finished_total", state=state)
+        self._notify()
+
+    def _on_bytes(self, bytes_done, bytes_total):
+        self.bytes_done = bytes_done
+        self.bytes_total = bytes_total
+        self._notify()
+
+    def _on_convert_progress(self, fraction):
+        # None while ffmpeg can't tell how far it is
+        if fraction is not None:
+            self.convert_progress = fraction
+        self._notify()
+
+    def _notify(self):
+        for listener in list(self.listeners):
+            listener(self)
+
+
+class JobScheduler:
+    """Runs download jobs concurrently with separate caps per phase.
+
+    Every running job has its own thread and holds a fetch, download, merge or convert
+    slot only while it is in that phase, so a slow merge or conversion never blocks other
+    jobs' transfers. At most `max_active` jobs run at once, enough to fill every phase;
+    the rest stay QUEUED without a thread until one finishes. A job waiting for a slot
+    is WAITING and can still be paused or cancelled. Conversions split the cores evenly between their ffmpeg processes.
+    With `profile_dir`, each job's thread runs under cProfile and its stats are saved
+    there as job<id>.prof; transfers run on worker threads and are not included.
+    """
+
+    def __init__(self, cache, max_fetches=MAX_CONCURRENT_FETCHES, max_downloads=MAX_CONCURRENT_DOWNLOADS,
+                 max_merges=MAX_CONCURRENT_MERGES, downloader=None, max_converts=MAX_CONCURRENT_CONVERTS, archive=None,
+                 profile_dir=None):
+        self.cache = cache
+        self.archive = archive
+        self.profile_dir = profile_dir
+        self.downloader = downloader or default_downloader
+        self.jobs = []
+        self._fetch_slots = threading.BoundedSemaphore(max_fetches)
+        self._download_slots = threading.BoundedSemaphore(max_downloads)
+        self._merge_slots = threading.BoundedSemaphore(max_merges)
+        self._convert_slots = threading.BoundedSemaphore(max_converts)
+        self.convert_threads = max(1, CPU_COUNT // max_converts)
+        self.max_active = max_fetches + max_downloads + max_merges + max_converts
+        self._lock = threading.Lock()
+        self._queue = collections.deque()  # submitted jobs that have no thread yet
+        self._active = 0
+        self._claims = {}  # absolute path -> job writing it
+        self._claims_changed = threading.Condition()
+
+    def submit(self, job):
+        with self._lock:
+            self.jobs.append(job)
+        self._dispatch(job)
+        return job
+
+    def resume(self, job):
+        if job.state == PAUSED:
+            job.cancel_event = threading.Event()
+            job._pause_requested = False
+            job._thread = None
+            job._set_state(QUEUED, "Queued")
+            self._dispatch(job)
+
+    def remove_finished(self):
+        with self._lock:
+            self.jobs = [job for job in self.jobs if not job.finished]
+
+    def wait(self):
+        # blocks until every submitted job has finished or been paused
+        while True:
+            with self._lock:
+                threads = [job._thread for job in self.jobs if job._thread and job._thread.is_alive()]
+                if not threads and not any(job.state == QUEUED for job in self._queue):
+                    return
+            for thread in threads:
+                thread.join()
+
+    def _dispatch(self, job=None):
+        # queues `job`, then starts queued jobs while fewer than max_active run
+        with self._lock:
+            if job is not None and job not in self._queue:
+                self._queue.append(job)  # a job paused before it started may still be queued
+            while self._queue and self._active < self.max_active:
+                job = self._queue.popleft()
+                with job._start_lock:
+                    if job.state != QUEUED:
+                        continue  # paused or cancelled before it started
+                    job._thread = threading.Thread(
+                        target=self._run_thread, args=(job,), daemon=True, name=f"job-{job.id}")
+                    self._active += 1
+                job._thread.start()
+
+    def _run_thread(self, job):
+        try:
+            if self.profile_dir:
+                self._run_profiled(job)
+            else:
+                self._run(job)
+        finally:
+            with self._lock:
+                self._active -= 1
+            self._dispatch()
+
+    def _run_profiled(self, job):
+        import cProfile
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.runcall(self._run, job)
+        finally:
+            os.makedirs(self.profile_dir, exist_ok=True)
+            path = os.path.join(self.profile_dir, f"job{job.id}.prof")
+            profiler.dump_stats(path)
+            logger.info(f"Profile of job {job.id} saved to {path}")
+
+    def archived(self, job):
+        # the archive entry for the job's video and format; needs no network access
+        if self.archive is None:
+            return None
+        try:
+            video_id = job.info.video_id if job.info else canonical_video_id(job.link)
+        except Exception:
+            return None  # not a video link; the fetch reports it
+        return self.archive.get(video_id, job.archive_format)
+
+    def _run(self, job):
+        try:
+            entry = self.archived(job)
+            if entry is not None:
+                job.output_path = entry["path"]
+                job._set_state(SKIPPED, f"Already downloaded as {job.output_path}")
+                return
+
+            # a job paused while converting already has its download
+            downloaded = job.output_path and os.path.exists(job.output_path)
+            if not downloaded:
+                self._fetch(job)
+            with self._claim(job):
+                if not downloaded:
+                    if job.choice == "both":
+                        self._download_both(job)
+                    else:
+                        self._download_single(job)
+                if job.convert:
+                    self._convert(job)
+            if self.archive is not None:
+                self.archive.add(job.info.video_id, job.archive_format, job.output_path)
+            job._set_state(DONE, f"Saved as {job.output_path}")
+
+        except (DownloadCancelled, ConversionCancelled):
+            if job._pause_requested:
+                job._set_state(PAUSED, "Paused")
+            else:
+                job._discard_partials()
+                job._set_state(CANCELLED, "Cancelled")
+
+        except Exception as e:
+            job.error = e
+            job._set_state(FAILED, f"Error: {e}")
+
+    @contextmanager
+    def _slot(self, job, slots, phase):
+        # holds one of `slots`; a job that has to wait shows it, and stops waiting once paused or cancelled
+        job._check_cancelled()
+        if not slots.acquire(blocking=False):
+            job._set_state(WAITING, f"Waiting for {phase} slot...")
+            while not slots.acquire(timeout=SLOT_WAIT_INTERVAL):
+                job._check_cancelled()
+        try:
+            job._check_cancelled()
+            yield
+        finally:
+            slots.release()
+
+    @contextmanager
+    def _claim(self, job):
+        """Reserves the files the job writes, waiting while another job holds any of them.
+
+        The same video queued twice, or a playlist repeating an entry, would otherwise
+        share temp streams, .part files and the output; the later job runs afterwards.
+        """
+        paths = [job.output_name]
+        if job.choice == "both":
+            paths += self._temp_paths(job)
+        paths = [os.path.abspath(path) for path in paths]
+
+        def taken():
+            return any(self._claims.get(path, job) is not job for path in paths)
+
+        with self._claims_changed:
+            if taken():
+                job._set_state(WAITING, "Waiting for another job writing the same file...")
+                while taken():
+                    self._claims_changed.wait(SLOT_WAIT_INTERVAL)
+                    job._check_cancelled()
+            for path in paths:
+                self._claims[path] = job
+        try:
+            yield
+        finally:
+            with self._claims_changed:
+                for path in paths:
+                    del self._claims[path]
+                self._claims_changed.notify_all()
+
+    def _fetch(self, job):
+        with self._slot(job, self._fetch_slots, "fetch"):
+            job._set_state(FETCHING, "Fetching info...")
+            with metrics.span("fetch", job=job.id, url=job.link):
+                job.info = self.cache.resolve(job.link)
+
+            if (job.choice in ("video", "both") and job.video is None) or (job.choice in ("audio", "both") and job.audio is None):
+                video, audio = job.policy.select(job.info.video_streams, job.info.audio_streams, job.choice, job.video)
+                job.video = job.video or video
+                job.audio = job.audio or audio
+            if not job.output_name:
+                job.output_name = render_output_name(job.output_template, job.info, job.video, job.audio)
+
+            # resolving the live streams may hit the network for entries loaded from disk
+            job._video_stream = self.cache.pytube_stream(job.link, job.video) if job.video else None
+            job._audio_stream = self.cache.pytube_stream(job.link, job.audio) if job.audio else None
+
+    def _download_single(self, job):
+        selected, stream = (job.video, job._video_stream) if job.choice == "video" else (job.audio, job._audio_stream)
+        ext = selected.mime_type.split('/')[-1]
+        path = f"{job.output_name}.{ext}"
+        job._partial_paths = [path]
+
+        with self._slot(job, self._download_slots, "download"):
+            job._set_state(DOWNLOADING, "Downloading...")
+            progress = CombinedProgress({0: stream.filesize}, job._on_bytes)
+            flows = self._flows(job, job.choice)
+            with metrics.span("transfer", job=job.id) as span:
+                self.downloader.download_any(
+                    stream, path, on_chunk=lambda n: progress.update(0, n), cancel_event=job.cancel_event,
+                    flow=flows[job.choice])
+                span["bytes"] = flows[job.choice].bytes
+        job.output_path = path
+        job._partial_paths = []  # the job's result now, kept even if a later conversion is cancelled
+
+    def _download_both(self, job):
+        if job.stream_merge and streaming_supported():
+            # streaming holds a transfer and an ffmpeg process at once; slots are always taken in this order
+            with self._slot(job, self._download_slots, "download"), self._slot(job, self._merge_slots, "merge"):
+                job._set_state(DOWNLOADING, "Downloading and merging streams...")
+                progress = CombinedProgress(
+                    {"video": job._video_stream.filesize, "audio": job._audio_stream.filesize}, job._on_bytes)
+                flows = self._flows(job, "video", "audio")
+                with metrics.span("stream_merge", job=job.id) as span:
+                    job.output_path, job.merge_seconds = stream_merge(
+                        self.downloader.iter_stream(
+                            job._video_stream, lambda n: progress.update("video", n), job.cancel_event, flows["video"]),
+                        self.downloader.iter_stream(
+                            job._audio_stream, lambda n: progress.update("audio", n), job.cancel_event, flows["audio"]),
+                        job.output_name, job.video.video_codec, job.audio.audio_codec,
+                    )
+                    span["bytes"] = flows["video"].bytes + flows["audio"].bytes
+            return
+
+        video_path, audio_path = self._temp_paths(job)
+        job._partial_paths = [video_path, audio_path]
+
+        with self._slot(job, self._download_slots, "download"):
+            job._set_state(DOWNLOADING, "Downloading video and audio streams...")
+            flows = self._flows(job, "video", "audio")
+            with metrics.span("transfer", job=job.id) as span:
+                download_parallel(
+                    [(job._video_stream, video_path), (job._audio_stream, audio_path)],
+                    on_progress=job._on_bytes,
+                    cancel_event=job.cancel_event,
+                    downloader=self.downloader,
+                    flows=[flows["video"], flows["audio"]],
+                )
+                span["bytes"] = flows["video"].bytes + flows["audio"].bytes
+
+        with self._slot(job, self._merge_slots, "merge"):
+            job._set_state(MERGING, "Merging streams...")
+            with metrics.span("merge", job=job.id):
+                job.output_path, job.merge_seconds = merge_streams(
+                    video_path, audio_path, job.output_name, job.video.video_codec, job.audio.audio_codec)
+
+        # the temp streams are only removed once the merge has succeeded
+        with metrics.span("cleanup", job=job.id):
+            for path in (video_path, audio_path):
+                try:
+                    os.remove(path)
+                    logger.info(f"Cleaned up {path}")
+                except OSError as e:
+                    logger.warning(f"Error cleaning up temp file {path}: {e}")
+        job._partial_paths = []
+
+    def _temp_paths(self, job):
+        # stable per video and stream, so a paused or failed job resumes its .part files
+        video_id = job.info.video_id
+        output_dir = os.path.dirname(job.output_name)
+        return (
+            os.path.join(output_dir, f"video_{video_id}_{job.video.itag}.{job._video_stream.subtype}"),
+            os.path.join(output_dir, f"audio_{video_id}_{job.audio.itag}.{job._audio_stream.subtype}"),
+        )
+
+    def _flows(self, job, *names):
+        # one rate limiter flow per stream, sharing the job's fair share
+        job._flows = {name: self.downloader.limiter.flow(job.id, job.priority) for name in names}
+        return job._flows
+
+    def _convert(self, job):
+        with self._slot(job, self._convert_slots, "convert"):
+            job.convert_progress = 0
+            job._set_state(CONVERTING, f"Converting to {job.convert}...")
+            source = job.output_path
+            with metrics.span("convert", job=job.id, target=str(job.convert)):
+                output_path, job.convert_seconds = convert_media(
+                    source, job.output_name, job.convert, on_progress=job._on_convert_progress,
+                    cancel_event=job.cancel_event, threads=self.convert_threads)
+
+        # the converted file replaces the download
+        if os.path.abspath(output_path) != os.path.abspath(source):
+            try:
+                os.remove(source)
+            except OSError as e:
+                logger.warning(f"Error removing {source} after conversion: {e}")
+        job.output_path = output_path
@@ -1,16 +1,29 @@
-import pytubefix
-from pytubefix import YouTube
 import customtkinter as ctk
-from PIL import Image
-from io import BytesIO
 from typing import Optional
-import ffmpeg
 import threading
 import functools
-import requests
+import importlib
+import logging
 import sys
 import os
-import re
+
+from jobs import (
+    CANCELLED, DONE, DOWNLOADING, FAILED, MERGING, PAUSED, SKIPPED, PROGRESS_STATES, QUALITY_PRESETS, DownloadJob, clean_filename,
+)
+from convert import CONVERT_PRESETS
+from archive import DownloadArchive
+from engine import DOWNLOAD_ARCHIVE_FILE, METADATA_CACHE_FILE, Engine
+from formats import FormatSelector
+from metadata_cache import MetadataCache, StreamInfo, VideoInfo, sort_streams
+from mux import streaming_supported
+from playlists import collection_kind
+from ratelimit import PRIORITY_HIGH, PRIORITY_NORMAL, RATE_LIMIT_PRESETS, format_rate
+from theme_registry import ThemeRegistry
+from thumbnails import THUMBNAIL_SIZE, ThumbnailCache
+from ui_updates import UiUpdateQueue
+
+logger = logging.getLogger(__name__)
+
 
 def resource_path(relative_path):
     try:
@@ -47,6 +60,20 @@ THEME_OPTIONS = {
     "Yellow": "./themes/yellow.json"
 }
 THEME_PREF_FILE = "theme_preference.txt"
+FALLBACK_THEME = "Blue"
+THUMBNAIL_CACHE_DIR = "thumbnail_cache"
+THROUGHPUT_REFRESH_MS = 1000
+
+# heavy modules are imported where first needed; these are preloaded once the window is up
+WARM_UP_MODULES = ("pytubefix", "requests", "ffmpeg")
+WARM_UP_DELAY_MS = 500
+
+
+# theme files are parsed on first use and kept, so switching back and forth never re-reads them
+theme_registry = ThemeRegistry({
+    name: resource_path(setting) if setting.endswith(".json") else setting
+    for name, setting in THEME_OPTIONS.items()
+})
 
 
 # reads the saved theme preference
@@ -68,52 +95,61 @@ def save_theme_preference(theme_name):
 # applies the theme preference found in the config file on startup
 def apply_initial_theme():
     theme_name = get_current_theme()
-    theme_setting = THEME_OPTIONS.get(theme_name)
-
-    if theme_setting and theme_setting.endswith(".json"):
-        try:
-            theme_file_path = resource_path(theme_setting)
-            ctk.set_default_color_theme(theme_file_path)
-        except Exception:
-            ctk.set_default_color_theme("blue")  # fallback
-    elif theme_setting:
-        ctk.set_default_color_theme(theme_setting)
+    if theme_name in THEME_OPTIONS:
+        set_theme(theme_name)
 
     return theme_name
 
-def clean_filename(title: str) -> str:
-    """Removes invalid characters and shortens long titles for file safety."""
-    safe_title = re.sub(r'[^\w\s-]', '', title).strip()
-    safe_title = re.sub(r'\s+', ' ', safe_title)
-    return safe_title[:100]
+
+# activates a theme for new widgets and recolors the existing ones under root in place
+def set_theme(theme_name, root=None):
+    try:
+        theme_registry.activate(theme_name, root)
+    except Exception as e:
+        logger.warning(f"Failed to load theme {theme_name}: {e}. Falling back to '{FALLBACK_THEME}'.")
+        theme_registry.activate(FALLBACK_THEME, root)
 
 class YouTubeDownloaderApp:
     def __init__(self, master):
         self.master = master
 
         # state variables
-        self.selected_video: Optional["pytubefix.streams.Stream"] = None
-        self.selected_audio: Optional["pytubefix.streams.Stream"] = None
+        self.selected_video: Optional[StreamInfo] = None
+        self.selected_audio: Optional[StreamInfo] = None
         self.selected_video_btn = None
         self.selected_audio_btn = None
-        self.current_yt_object: Optional[YouTube] = None
+        self.current_info: Optional[VideoInfo] = None
+        self.current_link = ""
+
+        # download queue: every job owns its streams, paths and state; the engine's
+        # metadata cache is shared by fetch, stream listing and the queue, and videos already
+        # in the download archive in the same format are skipped
+        self.engine = Engine(MetadataCache(disk_path=resource_path(METADATA_CACHE_FILE)),
+                             archive=DownloadArchive(resource_path(DOWNLOAD_ARCHIVE_FILE)))
+        self.thumbnails = ThumbnailCache(disk_dir=resource_path(THUMBNAIL_CACHE_DIR))
+        self.active_job: Optional[DownloadJob] = None
+        self.job_rows = {}
+
+        # worker threads hand widget updates to this queue instead of calling after(0, ...)
+        self.ui = UiUpdateQueue(master)
 
         # ctk string vars
         self.filename_var = ctk.StringVar(value="output")
         self.choice_var = ctk.StringVar(value="both")
+        self.stream_mux_var = ctk.BooleanVar(value=False)
+        self.quality_var = ctk.StringVar(value=list(QUALITY_PRESETS.keys())[1])
+        self.convert_var = ctk.StringVar(value=list(CONVERT_PRESETS.keys())[0])
+        self.rate_limit_var = ctk.StringVar(value=list(RATE_LIMIT_PRESETS.keys())[0])
         self.theme_var = ctk.StringVar(value=get_current_theme())
 
         # build the initial UI
         self.create_ui()
+        self._refresh_throughput()
 
     def create_ui(self):
-        # builds the entire UI, destroying previous widgets if called for theme change
-
-        for widget in self.master.winfo_children():
-            widget.destroy()
-
+        # builds the entire UI once; theme changes recolor it in place
         self.master.title("YouTube Downloader")
-        self.master.geometry("850x750")
+        self.master.geometry("850x900")
         self.master.grid_columnconfigure(0, weight=1)
 
         input_frame = ctk.CTkFrame(self.master)
@@ -155,8 +191,30 @@ class YouTubeDownloaderApp:
         self.audio_scroll = ctk.CTkScrollableFrame(lists_frame, label_text="Audio Streams (M4A/WEBM Sorted by Bitrate)")
         self.audio_scroll.grid(row=0, column=1, sticky="nsew", padx=5, pady=5)
 
+        queue_frame = ctk.CTkFrame(self.master)
+        queue_frame.grid(row=3, column=0, sticky="ew", padx=20, pady=10)
+        queue_frame.grid_columnconfigure(0, weight=1)
+
+        self.queue_label = ctk.CTkLabel(queue_frame, text="Download Queue", font=("Segoe UI", 13, "bold"))
+        self.queue_label.grid(row=0, column=0, padx=10, pady=(5, 0), sticky="w")
+
+        # format preselected after a fetch and used for queued videos not picked by hand, e.g. playlist
+        # entries; a preset or any format spec such as "bestvideo[height<=720]+bestaudio[ext=m4a]/best"
+        ctk.CTkLabel(queue_frame, text="Format:").grid(row=0, column=1, padx=(10, 5), pady=(5, 0))
+        ctk.CTkComboBox(queue_frame, values=list(QUALITY_PRESETS.keys()), variable=self.quality_var, width=190).grid(row=0, column=2, pady=(5, 0))
+
+        # one cap shared by every transfer, changeable while downloads run
+        ctk.CTkLabel(queue_frame, text="Speed limit:").grid(row=0, column=3, padx=(10, 5), pady=(5, 0))
+        ctk.CTkOptionMenu(queue_frame, values=list(RATE_LIMIT_PRESETS.keys()), variable=self.rate_limit_var,
+                          command=self.on_rate_limit_change, width=110).grid(row=0, column=4, pady=(5, 0))
+
+        ctk.CTkButton(queue_frame, text="Clear Finished", command=self.on_clear_finished, width=110).grid(row=0, column=5, padx=10, pady=(5, 0))
+
+        self.queue_scroll = ctk.CTkScrollableFrame(queue_frame, height=140)
+        self.queue_scroll.grid(row=1, column=0, columnspan=6, sticky="ew", padx=5, pady=5)
+
         control_frame = ctk.CTkFrame(self.master)
-        control_frame.grid(row=3, column=0, pady=(10, 20), padx=20, sticky="ew")
+        control_frame.grid(row=4, column=0, pady=(10, 20), padx=20, sticky="ew")
         control_frame.grid_columnconfigure(0, weight=1)
 
         filename_frame = ctk.CTkFrame(control_frame, fg_color="transparent")
@@ -168,6 +226,16 @@ class YouTubeDownloaderApp:
         filename_entry = ctk.CTkEntry(filename_frame, textvariable=self.filename_var, placeholder_text="Enter custom filename...")
         filename_entry.grid(row=0, column=1, sticky="ew")
 
+        # "both" mode only: pipe the downloads straight into ffmpeg instead of temp files
+        stream_mux_checkbox = ctk.CTkCheckBox(filename_frame, text="Stream merge (no temp files)", variable=self.stream_mux_var)
+        stream_mux_checkbox.grid(row=0, column=2, padx=(10, 0), sticky="e")
+        if not streaming_supported():
+            stream_mux_checkbox.configure(state="disabled")
+
+        # optional re-encode once a job's download is complete
+        ctk.CTkLabel(filename_frame, text="Convert:").grid(row=0, column=3, padx=(10, 5), sticky="e")
+        ctk.CTkOptionMenu(filename_frame, values=list(CONVERT_PRESETS.keys()), variable=self.convert_var, width=150).grid(row=0, column=4, sticky="e")
+
         controls_row = ctk.CTkFrame(control_frame, fg_color="transparent")
         controls_row.grid(row=1, column=0, columnspan=3, sticky="ew", padx=10, pady=(5, 5))
         controls_row.grid_columnconfigure(0, weight=1)
@@ -180,10 +248,20 @@ class YouTubeDownloaderApp:
         ctk.CTkRadioButton(radio_frame, text="Audio Only", variable=self.choice_var, value="audio").pack(side="left", padx=1)
         ctk.CTkRadioButton(radio_frame, text="Both", variable=self.choice_var, value="both").pack(side="left", padx=15)
 
-        self.download_button = ctk.CTkButton(controls_row, text="Download", command=self.on_download, width=150)
-        self.download_button.grid(row=0, column=1, padx=10)
+        buttons_frame = ctk.CTkFrame(controls_row, fg_color="transparent")
+        buttons_frame.grid(row=0, column=1, padx=10)
+
+        self.download_button = ctk.CTkButton(buttons_frame, text="Download", command=self.on_download, width=150)
+        self.download_button.pack(side="left")
         self.download_button.configure(state="disabled")  # disabled by default
 
+        queue_button = ctk.CTkButton(buttons_frame, text="Add to Queue", command=self.on_add_to_queue, width=110)
+        queue_button.pack(side="left", padx=(10, 0))
+
+        self.cancel_button = ctk.CTkButton(buttons_frame, text="Cancel", command=self.on_cancel, width=80)
+        self.cancel_button.pack(side="left", padx=(10, 0))
+        self.cancel_button.configure(state="disabled")  # only active while the Download job runs
+
         theme_selector_frame = ctk.CTkFrame(controls_row, fg_color="transparent")
         theme_selector_frame.grid(row=0, column=2, sticky="e")
 
@@ -200,139 +278,137 @@ class YouTubeDownloaderApp:
         theme_menu.pack(side="left", padx=5)
 
     def change_theme_event(self, theme_name):
-        # applies the new theme and rebuilds the UI dynamically
-
-        # save state before destruction
-        current_url = self.url_entry.get() if hasattr(self, 'url_entry') else ""
-        current_filename = self.filename_var.get()
-        current_choice = self.choice_var.get()
-
-        # apply the new theme globally
-        theme_setting = THEME_OPTIONS.get(theme_name)
-        if theme_setting and theme_setting.endswith(".json"):
-            try:
-                theme_file_path = resource_path(theme_setting)
-                ctk.set_default_color_theme(theme_file_path)
-            except Exception as e:
-                print(f"Failed to load theme {theme_setting}: {e}. Falling back to 'blue'.")
-                ctk.set_default_color_theme("blue")
-        elif theme_setting:
-            ctk.set_default_color_theme(theme_setting)
+        # recolors the existing widgets in place, so stream lists, thumbnail and entries survive
+        set_theme(theme_name, self.master)
 
         # save the user's choice
         save_theme_preference(theme_name)
 
-        # rebuild the entire UI
-        self.create_ui()
-
-        # restore state
-        self.master.after(0, lambda: self.url_entry.delete(0, 'end'))
-        self.master.after(0, lambda: self.url_entry.insert(0, current_url))
-        self.filename_var.set(current_filename)
-        self.choice_var.set(current_choice)
-        self.theme_var.set(theme_name)
-
     def getvideoinfo(self, link):
-        # fetches YouTube metadata and streams
-        self.current_yt_object = YouTube(link)
-        yt = self.current_yt_object
-        title = yt.title
-        thumbnail = yt.thumbnail_url
-        video = yt.streams.filter(progressive=False, type="video")
-        audio = yt.streams.filter(only_audio=True)
-        return yt, title, thumbnail, video, audio
+        # fetches YouTube metadata and streams, served from the cache when already resolved
+        self.current_info = self.engine.fetch(link)
+        self.current_link = link
+        info = self.current_info
+        return info, info.title, info.thumbnail_url, info.video_streams, info.audio_streams
 
     def _sort_streams(self, streams):
-        # sorts streams: first by MIME type (MP4 first), then by quality/bitrate (highest first)
-        def sort_key(stream):
-            mime_type = stream.mime_type
-            type_score = 0 if 'mp4' in mime_type else 1  # 0 for MP4/M4A, 1 for WebM
-
-            if hasattr(stream, 'resolution') and stream.resolution:
-                quality_score = int(stream.resolution.replace('p', ''))
-            elif hasattr(stream, 'abr') and stream.abr:
-                quality_score = int(stream.abr.replace('kbps', '').strip())
-            else:
-                quality_score = 0
-
-            # return tuple: (MIME type score, negative quality score for descending order)
-            return (type_score, -quality_score)
-
-        return sorted(streams, key=sort_key)
-
-    def list_video_streams(self, link):
-        video_streams = self.getvideoinfo(link)[3]
-        return self._sort_streams(video_streams)
-
-    def list_audio_streams(self, link):
-        audio_streams = self.getvideoinfo(link)[4]
-        return self._sort_streams(audio_streams)
+        # best first: resolution, fps, HDR and codec for video, bitrate and codec for audio
+        return sort_streams(streams)
+
+    def _format_selector(self):
+        # the chosen preset or typed format spec, or None (with the error shown) if it doesn't parse
+        spec = self.quality_var.get().strip()
+        if spec in QUALITY_PRESETS:
+            return QUALITY_PRESETS[spec]
+        try:
+            return FormatSelector(spec)
+        except ValueError as e:
+            self.status_label.configure(text=f"Invalid format: {e}", text_color="red")
+            return None
 
     def on_fetch(self):
-        threading.Thread(target=self._fetch_thread, daemon=True).start()
+        policy = self._format_selector()
+        if policy is None:
+            return
+        threading.Thread(target=self._fetch_thread, args=(policy,), daemon=True).start()
 
-    def _fetch_thread(self):
+    def _fetch_thread(self, policy):
         # reset state and UI
         self.selected_video = None
         self.selected_audio = None
         self.selected_video_btn = None
         self.selected_audio_btn = None
-        self.current_yt_object = None
+        self.current_info = None
 
         link = self.url_entry.get().strip()
         if not link:
-            self.master.after(0, lambda: self.title_label.configure(text="Please enter a valid URL."))
+            self.ui.call(lambda: self.title_label.configure(text="Please enter a valid URL."))
+            return
+        if collection_kind(link):
+            self.ui.call(lambda: self.title_label.configure(
+                text="Playlists and channels are downloaded with Add to Queue."))
             return
 
-        self.master.after(0, lambda: self.title_label.configure(text="Fetching info… please wait."))
-        self.master.after(0, lambda: self.status_label.configure(text=""))
-        self.master.after(0, lambda: [w.destroy() for w in self.video_scroll.winfo_children()])
-        self.master.after(0, lambda: [w.destroy() for w in self.audio_scroll.winfo_children()])
-        self.master.after(0, lambda: self.thumbnail_label.configure(image=None, text="(Thumbnail will appear here)"))
-        self.master.after(0, lambda: self.progress_bar.set(0))
-        self.master.after(0, lambda: self.download_button.configure(state="disabled"))
+        self.ui.call(self._reset_fetch_view)
 
         try:
-            yt, title, thumbnail, video, audio = self.getvideoinfo(link)
-            self.master.after(0, lambda: self.title_label.configure(text=title))
-            self.master.after(0, lambda: self.download_button.configure(state="normal"))
+            info, title, thumbnail, video, audio = self.getvideoinfo(link)
+
+            # thumbnail loads on its own pool while the stream lists are built
+            self.thumbnails.fetch_async(
+                info.video_id, thumbnail,
+                lambda image, error: self.ui.call(self._show_thumbnail, info.video_id, image, error))
+
+            def show_info():
+                self.title_label.configure(text=title)
+                self.download_button.configure(state="normal")
+                self.filename_var.set(clean_filename(title))  # default filename
+            self.ui.call(show_info)
+
+            # add stream buttons, one batch per list
+            video_entries = []
+            for stream in self._sort_streams(video):
+                ext = stream.mime_type.split("/")[-1]
+                video_entries.append((f"{stream.resolution or 'N/A'} | {stream.fps or 'N/A'}fps | {ext.upper()}", stream))
 
-            # set default filename
-            safe_title = clean_filename(title)
-            self.master.after(0, lambda t=safe_title: self.filename_var.set(t))
+            audio_entries = []
+            for stream in self._sort_streams(audio):
+                ext = stream.mime_type.split("/")[-1]
+                audio_entries.append((f"{stream.abr or 'N/A'} | {ext.upper()}", stream))
 
-            # thumbnail
+            # the format's picks start out selected, so Download works without clicking
             try:
-                response = requests.get(thumbnail, timeout=10)
-                img = Image.open(BytesIO(response.content)).resize((240, 135))
-                photo = ctk.CTkImage(light_image=img, size=(240, 135))
-                self.master.after(0, lambda: self._set_thumbnail(photo))
-            except Exception as e:
-                self.master.after(0, lambda err=e: self.title_label.configure(text=f"Image error: {e}"))
-
-            # add stream buttons
-            for stream in self.list_video_streams(link):
-                ext = stream.mime_type.split("/")[-1]
-                info = f"{stream.resolution or 'N/A'} | {stream.fps or 'N/A'}fps | {ext.upper()}"
-                self.master.after(0, lambda s=stream, t=info: self._add_stream_button(self.video_scroll, t, s, "video"))
+                picked_video, picked_audio = policy.select(video, audio)
+            except ValueError as e:
+                # nothing starts out selected; the streams can still be picked by hand
+                self.ui.call(lambda err=e: self.status_label.configure(text=f"Format: {err}", text_color="yellow"))
+                picked_video = picked_audio = None
 
-            for stream in self.list_audio_streams(link):
-                ext = stream.mime_type.split("/")[-1]
-                info = f"{stream.abr or 'N/A'} | {ext.upper()}"
-                self.master.after(0, lambda s=stream, t=info: self._add_stream_button(self.audio_scroll, t, s, "audio"))
+            self.ui.call(self._add_stream_buttons, "video", video_entries, picked_video)
+            self.ui.call(self._add_stream_buttons, "audio", audio_entries, picked_audio)
 
         except Exception as e:
-            self.master.after(0, lambda err=e: self.title_label.configure(text=f"Error: {e}"))
-            self.master.after(0, lambda: self.download_button.configure(state="disabled"))
+            def show_error(err=e):
+                self.title_label.configure(text=f"Error: {err}")
+                self.download_button.configure(state="disabled")
+            self.ui.call(show_error)
+
+    def _reset_fetch_view(self):
+        self.title_label.configure(text="Fetching info… please wait.")
+        self.status_label.configure(text="")
+        for scroll in (self.video_scroll, self.audio_scroll):
+            for w in scroll.winfo_children():
+                w.destroy()
+        self.thumbnail_label.configure(image=None, text="(Thumbnail will appear here)")
+        self.progress_bar.set(0)
+        self.download_button.configure(state="disabled")
+
+    def _show_thumbnail(self, video_id, image, error):
+        # a slow thumbnail from an earlier fetch must not replace the current one
+        if self.current_info is None or self.current_info.video_id != video_id:
+            return
+        if error:
+            self.title_label.configure(text=f"Image error: {error}")
+            return
+        self._set_thumbnail(ctk.CTkImage(light_image=image, size=THUMBNAIL_SIZE))
 
     def _set_thumbnail(self, photo):
         self.thumbnail_label.configure(image=photo, text="")
         self.thumbnail_label.image = photo
 
+    def _add_stream_buttons(self, mode, entries, picked=None):
+        # entries: (label, stream) pairs, added in a single UI update; `picked` starts out selected
+        parent = self.video_scroll if mode == "video" else self.audio_scroll
+        for text, stream in entries:
+            btn = self._add_stream_button(parent, text, stream, mode)
+            if stream is picked:
+                self.select_stream(stream, btn, mode)
+
     def _add_stream_button(self, parent, text, stream, mode):
         btn = ctk.CTkButton(parent, text=text, anchor="w")
         btn.configure(command=functools.partial(self.select_stream, stream, btn, mode))
         btn.pack(pady=3, padx=5, fill="x")
+        return btn
 
     def select_stream(self, stream, button, mode):
         selection_changed = False
@@ -356,121 +432,245 @@ class YouTubeDownloaderApp:
 
         if selection_changed:
             resolution = getattr(stream, 'resolution', getattr(stream, 'abr', ''))
-            print(f"Selected {mode}: {resolution} | {stream.mime_type}")
+            logger.info(f"Selected {mode}: {resolution} | {stream.mime_type}")
+
+    def on_progress(self, job):
+        # mirrors the job started with the Download button in the main status line and progress bar;
+        # called for every chunk, so only the latest state is drawn each frame
+        self.ui.coalesce("active job", self._show_active_job, job)
+
+    def _show_active_job(self, job):
+        if job is not self.active_job:
+            return
 
-    def on_progress(self, stream, chunk, bytes_remaining):
-        total_size = stream.filesize
-        bytes_downloaded = total_size - bytes_remaining
-        percentage_of_completion = bytes_downloaded / total_size
+        if job.state in PROGRESS_STATES:
+            self.progress_bar.set(job.progress)
+            self.status_label.configure(text=self._progress_text(job), text_color="white")
+        elif job.state == MERGING:
+            self.progress_bar.set(-1)  # indeterminate status
+            self.status_label.configure(text="Merging streams... (This may take a moment)", text_color="white")
+        elif job.state == DONE:
+            self.progress_bar.set(0)  # reset progress visual
+            if job.convert_seconds is not None:
+                text = f"Converted and saved as {job.output_path} ({job.convert_seconds:.1f}s)"
+            elif job.merge_seconds is not None:
+                text = f"Merged and saved as {job.output_path} ({job.merge_seconds:.1f}s)"
+            else:
+                text = "Download complete!"
+            self.status_label.configure(text=text, text_color="green")
+        elif job.state == SKIPPED:
+            self.progress_bar.set(0)
+            self.status_label.configure(text=job.status, text_color="green")
+        elif job.state == FAILED:
+            self.progress_bar.set(0)
+            self.status_label.configure(text=job.status, text_color="red")
+        elif job.state in (CANCELLED, PAUSED):
+            self.progress_bar.set(0)
+            self.status_label.configure(text=f"Download {job.state}.", text_color="yellow")
+        else:
+            self.status_label.configure(text=job.status, text_color="white")
 
-        self.master.after(0, lambda: self.progress_bar.set(percentage_of_completion))
-        self.master.after(0, lambda: self.status_label.configure(
-            text=f"Downloading... {percentage_of_completion * 100:.1f}%"))
+        self.cancel_button.configure(state="disabled" if job.finished or job.state == PAUSED else "normal")
 
-    def on_complete(self, stream, file_path):
-        print(f"Download of {stream.title} completed at {file_path}!")
-        self.master.after(0, lambda: self.status_label.configure(text="Download complete, starting merge.", text_color="white"))
+    def on_cancel(self):
+        if self.active_job:
+            self.active_job.cancel()
+        self.cancel_button.configure(state="disabled")
+        self.status_label.configure(text="Cancelling...", text_color="yellow")
 
     def on_download(self):
-        threading.Thread(target=self._download_thread, daemon=True).start()
+        choice = self.choice_var.get()
+        logger.info(f"Download mode: {choice}")
+
+        if choice == "video" and self.selected_video is None:
+            self.status_label.configure(text="No video selected.", text_color="yellow")
+            return
+        if choice == "audio" and self.selected_audio is None:
+            self.status_label.configure(text="No audio selected.", text_color="yellow")
+            return
+        if choice == "both" and not (self.selected_video and self.selected_audio):
+            self.status_label.configure(text="Select both video and audio first.", text_color="yellow")
+            return
+
+        job = DownloadJob(
+            self.current_link, choice,
+            output_name=self.filename_var.get().strip() or None,
+            video=self.selected_video if choice != "audio" else None,
+            audio=self.selected_audio if choice != "video" else None,
+            stream_merge=self.stream_mux_var.get(),
+            convert=CONVERT_PRESETS[self.convert_var.get()],
+            priority=PRIORITY_HIGH,  # the download being watched goes ahead of the queue
+        )
+        self.active_job = job
+        job.listeners.append(self.on_progress)
+        self.progress_bar.set(0)
+        self._submit_job(job)
+
+    def on_add_to_queue(self):
+        # queues the URL in the entry; streams are picked automatically unless it is the fetched one
+        link = self.url_entry.get().strip()
+        if not link:
+            self.title_label.configure(text="Please enter a valid URL.")
+            return
 
-    def _download_thread(self):
         choice = self.choice_var.get()
-        print(f"Download mode: {choice}")
-        self.master.after(0, lambda: self.status_label.configure(text="Downloading...", text_color="white"))
-        self.master.after(0, lambda: self.download_button.configure(state="disabled"))
+        policy = self._format_selector()
+        if policy is None:
+            return
+        convert = CONVERT_PRESETS[self.convert_var.get()]
 
-        video_path = None
-        audio_path = None
+        if collection_kind(link):
+            stream_merge = self.stream_mux_var.get()
+            threading.Thread(
+                target=self._expand_thread, args=(link, choice, policy, stream_merge, convert), daemon=True).start()
+            return
 
-        self.master.after(0, lambda: self.progress_bar.set(0))
+        fetched = self.current_info is not None and link == self.current_link
+        job = DownloadJob(
+            link, choice,
+            output_name=(self.filename_var.get().strip() or None) if fetched else None,
+            video=self.selected_video if fetched and choice != "audio" else None,
+            audio=self.selected_audio if fetched and choice != "video" else None,
+            stream_merge=self.stream_mux_var.get(),
+            policy=policy,
+            convert=convert,
+        )
+        self._submit_job(job)
 
-        try:
-            if choice == "video":
-                if self.selected_video is not None:
-                    ext = self.selected_video.mime_type.split('/')[-1]
-                    print("Downloading video...")
-                    self.selected_video.on_progress_callback = self.on_progress
-                    self.selected_video.download(filename=f"video.{ext}")
-                    self.master.after(0, lambda: self.status_label.configure(text="Download complete!", text_color="green"))
-                else:
-                    self.master.after(0, lambda: self.status_label.configure(text="No video selected.", text_color="yellow"))
-
-            elif choice == "audio":
-                if self.selected_audio is not None:
-                    ext = self.selected_audio.mime_type.split('/')[-1]
-                    print("Downloading audio...")
-                    self.selected_audio.on_progress_callback = self.on_progress
-                    self.selected_audio.download(filename=f"audio.{ext}")
-                    self.master.after(0, lambda: self.status_label.configure(text="Download complete!", text_color="green"))
-                else:
-                    self.master.after(0, lambda: self.status_label.configure(text="No audio selected.", text_color="yellow"))
-
-            elif choice == "both":
-                if self.selected_video and self.selected_audio:
-
-                    self.selected_video.on_progress_callback = self.on_progress
-                    self.selected_video.on_complete_callback = self.on_complete
-
-                    print("Downloading video stream...")
-                    video_path = self.selected_video.download(filename_prefix="video_")
-
-                    self.master.after(0, lambda: self.progress_bar.set(0))
-                    self.master.after(0, lambda: self.status_label.configure(text="Downloading audio stream...", text_color="white"))
-                    print("Downloading audio stream...")
-                    # audio progress not tracked, just status label
-                    audio_path = self.selected_audio.download(filename_prefix="audio_")
-
-                    custom_name = self.filename_var.get().strip()
-                    if not custom_name and self.current_yt_object:
-                        custom_name = clean_filename(self.current_yt_object.title)
-                    elif not custom_name:
-                        custom_name = "output"  # fallback
-
-                    output_path = f"{custom_name}.mp4"
-                    print(f"Merging streams into {output_path}...")
-                    self.master.after(0, lambda: self.status_label.configure(
-                        text="Merging streams... (This may take a moment)", text_color="white"))
-                    self.master.after(0, lambda: self.progress_bar.set(-1))  # indeterminate status
-
-                    (
-                        ffmpeg.concat(
-                            ffmpeg.input(video_path),
-                            ffmpeg.input(audio_path),
-                            v=1, a=1,
-                        ).output(output_path, vcodec='copy', acodec='copy')
-                        .run(overwrite_output=True)
-                    )
-
-                    print("Merged and saved as", output_path)
-                    self.master.after(0, lambda: self.status_label.configure(text=f"Merged and saved as {output_path}", text_color="green"))
-                    self.master.after(0, lambda: self.progress_bar.set(1.0))
-
-                else:
-                    self.master.after(0, lambda: self.status_label.configure(text="Select both video and audio first.", text_color="yellow"))
+    def _expand_thread(self, link, choice, policy, stream_merge, convert):
+        # queues every entry of a playlist/channel as soon as its metadata has resolved
+        self.ui.call(lambda: self.status_label.configure(text="Expanding playlist...", text_color="white"))
+        counts = {"queued": 0, "failed": 0}
+        lock = threading.Lock()
+
+        def count(key):
+            with lock:
+                counts[key] += 1
+                text = f"Expanding playlist... {counts['queued']} queued, {counts['failed']} failed"
+            self.ui.coalesce("playlist status", lambda: self.status_label.configure(text=text, text_color="white"))
 
+        def on_job(job):
+            self._watch_job(job)
+            self.ui.call(self._add_job_row, job)
+            count("queued")
+
+        try:
+            self.engine.add(link, choice, policy, stream_merge=stream_merge, on_job=on_job,
+                            on_error=lambda entry_link, error: count("failed"), convert=convert)
+            text = f"Playlist expanded: {counts['queued']} queued, {counts['failed']} failed"
+            self.ui.coalesce("playlist status", lambda: self.status_label.configure(text=text, text_color="green"))
         except Exception as e:
-            print(f"Download error: {e}")
-            self.master.after(0, lambda err=e: self.status_label.configure(text=f"Error: {e}", text_color="red"))
+            logger.warning(f"Playlist error: {e}")
+            self.ui.coalesce("playlist status", lambda err=e: self.status_label.configure(text=f"Error: {err}", text_color="red"))
+
+    def _submit_job(self, job):
+        self._add_job_row(job)
+        self._watch_job(job)
+        self.engine.submit(job)
+
+    def _watch_job(self, job):
+        job.listeners.append(lambda j: self.ui.coalesce(("job row", j.id), self._refresh_job_row, j))
+
+    def _add_job_row(self, job):
+        row = ctk.CTkFrame(self.queue_scroll)
+        row.pack(pady=3, padx=5, fill="x")
+        row.grid_columnconfigure(0, weight=1)
+
+        title_label = ctk.CTkLabel(row, text="", anchor="w")
+        title_label.grid(row=0, column=0, padx=(10, 5), sticky="ew")
+
+        status_label = ctk.CTkLabel(row, text="", anchor="e", font=("Segoe UI", 12))
+        status_label.grid(row=0, column=1, padx=5, sticky="e")
+
+        progress_bar = ctk.CTkProgressBar(row, orientation="horizontal", height=8)
+        progress_bar.grid(row=1, column=0, columnspan=2, padx=(10, 5), pady=(0, 8), sticky="ew")
+
+        priority_button = ctk.CTkButton(row, text="", width=70, command=functools.partial(self.on_priority_job, job))
+        priority_button.grid(row=0, column=2, rowspan=2, padx=3)
+
+        pause_button = ctk.CTkButton(row, text="Pause", width=70, command=functools.partial(self.on_pause_job, job))
+        pause_button.grid(row=0, column=3, rowspan=2, padx=3)
+
+        cancel_button = ctk.CTkButton(row, text="Cancel", width=70, command=job.cancel)
+        cancel_button.grid(row=0, column=4, rowspan=2, padx=(3, 10))
+
+        self.job_rows[job.id] = {
+            "frame": row,
+            "title": title_label,
+            "status": status_label,
+            "progress": progress_bar,
+            "priority": priority_button,
+            "pause": pause_button,
+            "cancel": cancel_button,
+        }
+        self._refresh_job_row(job)
+
+    def _refresh_job_row(self, job):
+        widgets = self.job_rows.get(job.id)
+        if not widgets:
+            return
 
-        finally:
-            self.master.after(0, lambda: self.progress_bar.set(0))  # reset progress visual
-            self.master.after(0, lambda: self.download_button.configure(state="normal"))
+        title = job.title if len(job.title) <= 60 else job.title[:57] + "..."
+        status = self._progress_text(job) if job.state in PROGRESS_STATES else job.status
+        widgets["title"].configure(text=title)
+        widgets["status"].configure(text=status)
+        widgets["progress"].set(1.0 if job.state in (DONE, SKIPPED) else job.progress)
+        widgets["priority"].configure(
+            text="High" if job.priority == PRIORITY_HIGH else "Normal",
+            state="disabled" if job.finished else "normal")
+        widgets["pause"].configure(
+            text="Resume" if job.state == PAUSED else "Pause",
+            state="disabled" if job.finished else "normal")
+        widgets["cancel"].configure(state="disabled" if job.finished else "normal")
+
+    def _progress_text(self, job):
+        text = f"{job.status} {job.progress * 100:.1f}%"
+        if job.state == DOWNLOADING and job.speed:
+            text += f" ({format_rate(job.speed)})"
+        return text
+
+    def on_priority_job(self, job):
+        # high priority jobs get four times the share of a capped bandwidth
+        job.set_priority(PRIORITY_NORMAL if job.priority == PRIORITY_HIGH else PRIORITY_HIGH)
+        self._refresh_job_row(job)
+
+    def on_rate_limit_change(self, choice):
+        self.engine.limiter.rate = RATE_LIMIT_PRESETS[choice]
+
+    def _refresh_throughput(self):
+        # combined speed of every transfer in the queue header, sampled once a second
+        rate = self.engine.limiter.throughput
+        self.queue_label.configure(text=f"Download Queue ({format_rate(rate)})" if rate else "Download Queue")
+        self.master.after(THROUGHPUT_REFRESH_MS, self._refresh_throughput)
+
+    def on_pause_job(self, job):
+        if job.state == PAUSED:
+            self.engine.scheduler.resume(job)
+        else:
+            job.pause()
 
-            # clean up temporary files
-            try:
-                if video_path and os.path.exists(video_path):
-                    os.remove(video_path)
-                    print(f"Cleaned up {video_path}")
-                if audio_path and os.path.exists(audio_path):
-                    os.remove(audio_path)
-                    print(f"Cleaned up {audio_path}")
-            except Exception as e:
-                print(f"Error cleaning up temp files: {e}")
+    def on_clear_finished(self):
+        self.engine.scheduler.remove_finished()
+        remaining = {job.id for job in self.engine.jobs}
+        for job_id in list(self.job_rows):
+            if job_id not in remaining:
+                self.job_rows.pop(job_id)["frame"].destroy()
+
+
+# imports what the first fetch and merge need, so the first click does not pay for it
+def warm_up_imports():
+    for name in WARM_UP_MODULES:
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            logger.warning(f"Warm-up import of {name} failed: {e}")
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     apply_initial_theme()
     root = ctk.CTk()
     app = YouTubeDownloaderApp(root)
-    root.mainloop()
\ No newline at end of file
+    root.after(WARM_UP_DELAY_MS, lambda: threading.Thread(target=warm_up_imports, daemon=True).start())
+    root.mainloop()
+    app.engine.cache.flush()
@@ -0,0 +1,288 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Optional
+
+from formats import stream_rank
+
+logger = logging.getLogger(__name__)
+
+# note: signed stream urls stop working after a few hours, so entries never outlive them
+DEFAULT_TTL = 60 * 60
+DEFAULT_MAX_ENTRIES = 128
+URL_EXPIRY_MARGIN = 5 * 60
+# disk writes are batched: the first change schedules one write of the whole cache this much later
+SAVE_DELAY = 2.0
+
+
+def canonical_video_id(link: str) -> str:
+    """Maps any YouTube URL form (watch, youtu.be, shorts, embed) to its 11-char video ID."""
+    from pytubefix import extract
+
+    return extract.video_id(link)
+
+
+class StreamInfo:
+    # the stream attributes the app works with, detached from the pytubefix object
+    FIELDS = (
+        "itag", "url", "mime_type", "type", "subtype", "video_codec", "audio_codec",
+        "resolution", "fps", "abr", "filesize", "is_progressive", "is_hdr",
+    )
+
+    def __init__(self, stream=None, **fields):
+        for name in self.FIELDS:
+            setattr(self, name, fields.get(name))
+        # the live pytubefix Stream, only present for entries resolved in this session
+        self.stream = stream
+        self._attrs = None
+
+    @classmethod
+    def from_stream(cls, stream):
+        return cls(stream=stream, **{name: getattr(stream, name, None) for name in cls.FIELDS})
+
+    @property
+    def url_expires_at(self) -> Optional[int]:
+        match = re.search(r"[?&]expire=(\d+)", self.url or "")
+        return int(match.group(1)) if match else None
+
+    @property
+    def attrs(self):
+        # the normalized attributes format filters and ranking read, parsed once per stream
+        if self._attrs is None:
+            kind = self.type or (self.mime_type or "").split("/")[0]
+            ext = (self.subtype or (self.mime_type or "/").split("/")[1]).lower()
+            if kind == "audio" and ext == "mp4":
+                ext = "m4a"
+            attrs = {
+                "kind": kind,
+                "ext": ext,
+                "itag": _number(self.itag),
+                "height": _number(self.resolution),
+                "fps": _number(self.fps),
+                "abr": _number(self.abr),
+                "filesize": _number(self.filesize),
+                "vcodec": (self.video_codec or "").lower() if kind == "video" else "",
+                "acodec": (self.audio_codec or "").lower() if kind == "audio" else "",
+                "hdr": bool(self.is_hdr),
+            }
+            attrs["rank"] = stream_rank(attrs)
+            self._attrs = attrs
+        return self._attrs
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+
+def _number(value):
+    # 1080 from "1080p", 128 from "128kbps", None if missing
+    if value is None or isinstance(value, (int, float)):
+        return value
+    match = re.match(r"\s*(\d+(?:\.\d+)?)", str(value))
+    return float(match.group(1)) if match else None
+
+
+def sort_streams(streams):
+    # best first, ranked the way the format selector picks "best"
+    return sorted(streams, key=lambda stream: stream.attrs["rank"], reverse=True)
+
+
+class VideoInfo:
+    def __init__(self, video_id, title, thumbnail_url, video_streams, audio_streams, fetched_at=None):
+        self.video_id = video_id
+        self.title = title
+        self.thumbnail_url = thumbnail_url
+        self.video_streams = video_streams
+        self.audio_streams = audio_streams
+        self.fetched_at = fetched_at if fetched_at is not None else time.time()
+
+    def expires_at(self, ttl):
+        expiry = self.fetched_at + ttl
+        for stream in self.video_streams + self.audio_streams:
+            url_expiry = stream.url_expires_at
+            if url_expiry is not None:
+                expiry = min(expiry, url_expiry - URL_EXPIRY_MARGIN)
+        return expiry
+
+    def to_dict(self):
+        return {
+            "video_id": self.video_id,
+            "title": self.title,
+            "thumbnail_url": self.thumbnail_url,
+            "video_streams": [s.to_dict() for s in self.video_streams],
+            "audio_streams": [s.to_dict() for s in self.audio_streams],
+            "fetched_at": self.fetched_at,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data["video_id"],
+            data["title"],
+            data["thumbnail_url"],
+            [StreamInfo(**s) for s in data["video_streams"]],
+            [StreamInfo(**s) for s in data["audio_streams"]],
+            fetched_at=data["fetched_at"],
+        )
+
+
+class MetadataCache:
+    """TTL + LRU cache of resolved video metadata, keyed by canonical video ID.
+
+    Concurrent lookups of the same video share a single resolution. If `disk_path`
+    is given, entries are also persisted there so a restart starts warm; changes are
+    written in batches at most every SAVE_DELAY seconds, call flush() before exiting. `youtube`
+    builds the YouTube object for a link, pytubefix.YouTube by default; the offline
+    backend in benchmarks/fake_youtube.py plugs in here.
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES, disk_path=None, youtube=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.disk_path = disk_path
+        self.youtube = youtube
+        self._entries: "OrderedDict[str, VideoInfo]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+        self._resolving: dict = {}  # video_id -> lock held while that video is being resolved
+        self._save_timer = None  # pending batched disk write
+
+        if disk_path:
+            self._load_disk()
+
+    def get(self, link) -> Optional[VideoInfo]:
+        return self._get(canonical_video_id(link))
+
+    def resolve(self, link) -> VideoInfo:
+        # returns the cached entry, or resolves the video against YouTube exactly once
+        video_id = canonical_video_id(link)
+        info = self._get(video_id)
+        if info is not None:
+            return info
+
+        with self._video_lock(video_id):
+            # another thread may have finished resolving while we waited
+            info = self._get(video_id)
+            if info is None:
+                info = self._fetch(link, video_id)
+                self.put(info)
+        return info
+
+    def put(self, info: VideoInfo):
+        with self._lock:
+            self._entries[info.video_id] = info
+            self._entries.move_to_end(info.video_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        self._save_disk()
+
+    def invalidate(self, link):
+        with self._lock:
+            self._entries.pop(canonical_video_id(link), None)
+        self._save_disk()
+
+    def pytube_stream(self, link, stream_info: StreamInfo):
+        """The live pytubefix stream for `stream_info`.
+
+        Entries loaded from disk carry descriptors only; the first stream asked for
+        looks the video up once and attaches live streams to every stream of its entry.
+        """
+        if stream_info.stream is not None:
+            return stream_info.stream
+        video_id = canonical_video_id(link)
+        with self._video_lock(video_id):
+            if stream_info.stream is None:
+                info = self._get(video_id)
+                streams = [stream_info] + (info.video_streams + info.audio_streams if info else [])
+                live = self._youtube(link).streams
+                for stream in streams:
+                    if stream.stream is None:
+                        stream.stream = live.get_by_itag(stream.itag)
+        return stream_info.stream
+
+    @contextmanager
+    def _video_lock(self, video_id):
+        # serializes lookups of one video, so concurrent callers share a single one
+        with self._lock:
+            video_lock = self._resolving.setdefault(video_id, threading.Lock())
+        try:
+            with video_lock:
+                yield
+        finally:
+            with self._lock:
+                self._resolving.pop(video_id, None)
+
+    def _get(self, video_id) -> Optional[VideoInfo]:
+        with self._lock:
+            info = self._entries.get(video_id)
+            if info is None:
+                return None
+            if time.time() >= info.expires_at(self.ttl):
+                del self._entries[video_id]
+                return None
+            self._entries.move_to_end(video_id)
+            return info
+
+    def _youtube(self, link):
+        if self.youtube is not None:
+            return self.youtube(link)
+        # pytubefix is imported on the first fetch, it is the slowest import at startup
+        from pytubefix import YouTube
+
+        return YouTube(link)
+
+    def _fetch(self, link, video_id) -> VideoInfo:
+        yt = self._youtube(link)
+        video = [StreamInfo.from_stream(s) for s in yt.streams.filter(progressive=False, type="video")]
+        audio = [StreamInfo.from_stream(s) for s in yt.streams.filter(only_audio=True)]
+        return VideoInfo(video_id, yt.title, yt.thumbnail_url, video, audio)
+
+    def _load_disk(self):
+        if not os.path.exists(self.disk_path):
+            return
+        try:
+            with open(self.disk_path, "r") as f:
+                entries = [VideoInfo.from_dict(d) for d in json.load(f)]
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable metadata cache {self.disk_path}: {e}")
+            return
+
+        now = time.time()
+        with self._lock:
+            for info in sorted(entries, key=lambda i: i.fetched_at)[-self.max_entries:]:
+                if now < info.expires_at(self.ttl):
+                    self._entries[info.video_id] = info
+
+    def flush(self):
+        # writes pending changes right away instead of waiting for the batched write
+        if not self.disk_path:
+            return
+        # held from snapshot to rename, so an older snapshot never replaces a newer one
+        with self._disk_lock:
+            with self._lock:
+                if self._save_timer is None:
+                    return
+                self._save_timer.cancel()
+                self._save_timer = None
+                data = [info.to_dict() for info in self._entries.values()]
+            tmp_path = f"{self.disk_path}.tmp"
+            try:
+                with open(tmp_path, "w") as f:
+                    json.dump(data, f)
+                os.replace(tmp_path, self.disk_path)
+            except Exception as e:
+                logger.warning(f"Error saving metadata cache: {e}")
+
+    def _save_disk(self):
+        # a burst of changes (e.g. a playlist prefetch) costs one write, not one per entry
+        if not self.disk_path:
+            return
+        with self._lock:
+            if self._save_timer is None:
+                self._save_timer = threading.Timer(SAVE_DELAY, self.flush)
+                self._save_timer.daemon = True
+                self._save_timer.start()
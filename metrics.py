@@ -0,0 +1,169 @@
+"""Counters, phase timings and structured logs for the download pipeline.
+
+    with metrics.span("merge", job=3) as span:
+        ...
+        span["bytes"] = size  # optional fields end up in the log line and byte counters
+
+Every span feeds the phase duration histogram and, once a log is configured, writes a
+JSON line. render_prometheus() returns everything in the Prometheus text format, which
+write_prometheus() saves to a file and serve_prometheus() serves over local HTTP.
+"""
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+METRIC_PREFIX = "ytdownload_"
+
+# upper bounds of the phase duration histogram, in seconds
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _label_text(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}  # (name, labels) -> value
+        self._histograms = {}  # (name, labels) -> [count per bucket..., sum, count]
+        self._gauges = {}  # name -> callback returning the current value
+        self._help = {}
+        self._log = None
+        self._log_lock = threading.Lock()
+
+    def configure_log(self, path):
+        # JSON lines go to `path` ("-" for stderr); None turns logging off
+        if self._log not in (None, sys.stderr):
+            self._log.close()
+        self._log = None if path is None else sys.stderr if path == "-" else open(path, "a")
+
+    def log(self, event, **fields):
+        if self._log is None:
+            return
+        line = json.dumps({"time": round(time.time(), 3), "event": event, **fields}, default=str)
+        with self._log_lock:
+            self._log.write(line + "\n")
+            self._log.flush()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            buckets = self._histograms.setdefault(key, [0] * (len(DURATION_BUCKETS) + 2))
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if value <= bound:
+                    buckets[i] += 1
+            buckets[-2] += value
+            buckets[-1] += 1
+
+    def gauge(self, name, callback, help_text=""):
+        # callback() is read whenever metrics are rendered
+        self._gauges[name] = callback
+        if help_text:
+            self._help[name] = help_text
+
+    @contextmanager
+    def span(self, phase, **fields):
+        """Times a phase; the yielded dict takes extra fields, "bytes" also counts as throughput."""
+        extra = {}
+        status = "ok"
+        start = time.perf_counter()
+        try:
+            yield extra
+        except BaseException as e:
+            status = "error"
+            extra["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            self.observe("phase_duration_seconds", duration, phase=phase)
+            self.inc("phase_total", phase=phase, status=status)
+            if extra.get("bytes"):
+                self.inc("phase_bytes_total", extra["bytes"], phase=phase)
+                extra["bytes_per_second"] = round(extra["bytes"] / duration) if duration else None
+            self.log("span", phase=phase, status=status, duration=round(duration, 4), **fields, **extra)
+
+    def render_prometheus(self):
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items())
+
+        typed = set()
+        for (name, labels), value in counters:
+            full = METRIC_PREFIX + name
+            if full not in typed:
+                typed.add(full)
+                lines.append(f"# TYPE {full} counter")
+            lines.append(f"{full}{_label_text(labels)} {value}")
+
+        for (name, labels), buckets in histograms:
+            full = METRIC_PREFIX + name
+            if full not in typed:
+                typed.add(full)
+                lines.append(f"# TYPE {full} histogram")
+            for bound, count in zip(DURATION_BUCKETS, buckets):
+                lines.append(f"{full}_bucket{_label_text(labels + (('le', bound),))} {count}")
+            lines.append(f"{full}_bucket{_label_text(labels + (('le', '+Inf'),))} {buckets[-1]}")
+            lines.append(f"{full}_sum{_label_text(labels)} {buckets[-2]:.6f}")
+            lines.append(f"{full}_count{_label_text(labels)} {buckets[-1]}")
+
+        for name, callback in sorted(self._gauges.items()):
+            full = METRIC_PREFIX + name
+            if name in self._help:
+                lines.append(f"# HELP {full} {self._help[name]}")
+            lines.append(f"# TYPE {full} gauge")
+            try:
+                lines.append(f"{full} {callback()}")
+            except Exception as e:
+                logger.warning(f"Gauge {name} failed: {e}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        # atomic, so a scraper reading the file never sees half of it
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.render_prometheus())
+        os.replace(tmp_path, path)
+
+    def serve_prometheus(self, port, host="127.0.0.1"):
+        """Serves /metrics on a daemon thread; returns the server (call shutdown() to stop)."""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render_prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True, name="metrics-http").start()
+        return server
+
+
+# shared by every module of the app
+metrics = Metrics()
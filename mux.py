@@ -0,0 +1,173 @@
+import errno
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# note: ffmpeg-python is imported on the first merge to keep startup fast
+
+# codec families each container can hold without re-encoding
+CONTAINER_CODECS = {
+    "mp4": {"video": ("avc1", "hev1", "hvc1", "av01", "vp09", "vp9"), "audio": ("mp4a", "opus", "ac-3", "ec-3")},
+    "webm": {"video": ("vp8", "vp9", "vp09", "av01"), "audio": ("opus", "vorbis")},
+}
+
+# encoders used when the chosen container cannot hold a codec as-is
+FALLBACK_ENCODERS = {
+    "mp4": {"video": "libx264", "audio": "aac"},
+    "webm": {"video": "libvpx-vp9", "audio": "libopus"},
+}
+
+
+def _codec_fits(container, kind, codec):
+    if container == "mkv":
+        return True
+    return bool(codec) and codec.lower().startswith(CONTAINER_CODECS[container][kind])
+
+
+def choose_container(video_codec, audio_codec, preferred=None):
+    """Picks the output container and ffmpeg codec arguments for a video/audio pair.
+
+    Streams are copied whenever the container can hold them. Without a `preferred`
+    container the first of webm, mp4, mkv that fits both codecs is used, so this never
+    transcodes; with one, only the codec that does not fit is re-encoded.
+    Returns (container, vcodec, acodec).
+    """
+    if preferred:
+        if preferred == "mkv":
+            return "mkv", "copy", "copy"
+        vcodec = "copy" if _codec_fits(preferred, "video", video_codec) else FALLBACK_ENCODERS[preferred]["video"]
+        acodec = "copy" if _codec_fits(preferred, "audio", audio_codec) else FALLBACK_ENCODERS[preferred]["audio"]
+        return preferred, vcodec, acodec
+
+    for container in ("webm", "mp4"):
+        if _codec_fits(container, "video", video_codec) and _codec_fits(container, "audio", audio_codec):
+            return container, "copy", "copy"
+    return "mkv", "copy", "copy"
+
+
+def merge_streams(video_path, audio_path, output_base, video_codec, audio_codec, preferred_container=None):
+    """Muxes the video track of one file with the audio track of another.
+
+    Maps the streams directly (-map 0:v -map 1:a) instead of going through a filtergraph,
+    so compatible codecs are stream-copied. Returns (output_path, seconds taken).
+    """
+    import ffmpeg
+
+    container, vcodec, acodec = choose_container(video_codec, audio_codec, preferred_container)
+    output_path = f"{output_base}.{container}"
+
+    start = time.perf_counter()
+    video = ffmpeg.input(video_path).video
+    audio = ffmpeg.input(audio_path).audio
+    try:
+        (
+            ffmpeg.output(video, audio, output_path, vcodec=vcodec, acodec=acodec)
+            .run(overwrite_output=True, quiet=True)
+        )
+    except ffmpeg.Error as e:
+        details = e.stderr.decode(errors="replace").strip().splitlines() if e.stderr else []
+        raise RuntimeError(f"ffmpeg merge failed: {details[-1] if details else e}") from e
+    elapsed = time.perf_counter() - start
+
+    mode = "remuxed" if vcodec == acodec == "copy" else f"transcoded (video: {vcodec}, audio: {acodec})"
+    logger.info(f"Merged into {output_path}, {mode} in {elapsed:.2f}s")
+    return output_path, elapsed
+
+
+def streaming_supported():
+    # streaming mode feeds ffmpeg through named FIFOs, which need a POSIX os.mkfifo
+    return hasattr(os, "mkfifo")
+
+
+def _open_fifo_for_write(path, process):
+    # a plain open() blocks forever if ffmpeg exits before opening its inputs, so poll instead
+    while True:
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_NONBLOCK)
+        except OSError as e:
+            if e.errno != errno.ENXIO:
+                raise
+            if process.poll() is not None:
+                raise RuntimeError("ffmpeg exited before reading its inputs")
+            time.sleep(0.02)
+            continue
+        os.set_blocking(fd, True)
+        return os.fdopen(fd, "wb")
+
+
+def _feed_fifo(path, chunks, process, errors):
+    try:
+        with _open_fifo_for_write(path, process) as fifo:
+            for chunk in chunks:
+                fifo.write(chunk)
+    except Exception as e:
+        errors.append(e)
+        # stops ffmpeg so the other feeder fails fast instead of blocking on its pipe
+        process.kill()
+    finally:
+        close = getattr(chunks, "close", None)
+        if close:
+            close()
+
+
+def stream_merge(video_chunks, audio_chunks, output_base, video_codec, audio_codec, preferred_container=None):
+    """Muxes two streams while they download, without writing either to disk.
+
+    `video_chunks` and `audio_chunks` are iterables of bytes in stream order; each is
+    written into its own named FIFO that ffmpeg reads as an input, and the output is
+    written fragmented so only the merged file ever reaches disk. Memory use is bounded
+    by whatever the iterables buffer. Returns (output_path, seconds taken).
+    """
+    import ffmpeg
+
+    container, vcodec, acodec = choose_container(video_codec, audio_codec, preferred_container)
+    output_path = f"{output_base}.{container}"
+    output_args = {"vcodec": vcodec, "acodec": acodec}
+    if container == "mp4":
+        # the moov atom can't be written up front for a stream of unknown length
+        output_args["movflags"] = "frag_keyframe+empty_moov+default_base_moof"
+
+    start = time.perf_counter()
+    fifo_dir = tempfile.mkdtemp(prefix="ytdownload-")
+    try:
+        video_fifo = os.path.join(fifo_dir, "video")
+        audio_fifo = os.path.join(fifo_dir, "audio")
+        os.mkfifo(video_fifo)
+        os.mkfifo(audio_fifo)
+
+        process = (
+            ffmpeg.output(ffmpeg.input(video_fifo).video, ffmpeg.input(audio_fifo).audio, output_path, **output_args)
+            .global_args("-loglevel", "error")
+            .run_async(overwrite_output=True, pipe_stderr=True)
+        )
+
+        errors = []
+        feeders = [
+            threading.Thread(target=_feed_fifo, args=(video_fifo, video_chunks, process, errors), daemon=True),
+            threading.Thread(target=_feed_fifo, args=(audio_fifo, audio_chunks, process, errors), daemon=True),
+        ]
+        for feeder in feeders:
+            feeder.start()
+        for feeder in feeders:
+            feeder.join()
+
+        _, stderr = process.communicate()
+    finally:
+        shutil.rmtree(fifo_dir, ignore_errors=True)
+
+    if errors or process.returncode != 0:
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        if errors:
+            raise errors[0]
+        details = stderr.decode(errors="replace").strip().splitlines() if stderr else []
+        raise RuntimeError(f"ffmpeg merge failed: {details[-1] if details else process.returncode}")
+
+    elapsed = time.perf_counter() - start
+    logger.info(f"Streamed and merged into {output_path} in {elapsed:.2f}s")
+    return output_path, elapsed
@@ -0,0 +1,67 @@
+import itertools
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlparse
+
+from metadata_cache import canonical_video_id
+
+MAX_PREFETCH_WORKERS = 8
+
+
+def collection_kind(link):
+    """Returns "playlist" or "channel" for collection URLs, None for single videos.
+
+    A video URL that merely carries a `list=` parameter (watch?v=, youtu.be/ or embed/,
+    as shared from inside a playlist) still counts as a single video.
+    """
+    parsed = urlparse(link)
+    if parsed.path.startswith("/playlist"):
+        return "playlist"
+    if re.match(r"^/(@[^/]+|channel/|c/|user/)", parsed.path):
+        return "channel"
+    if "list" in parse_qs(parsed.query) and not _has_video_id(link):
+        return "playlist"
+    return None
+
+
+def _has_video_id(link):
+    try:
+        canonical_video_id(link)
+    except Exception:
+        return False
+    return True
+
+
+def iter_collection(link, limit=None):
+    # video URLs of a playlist or channel, paged in lazily as they are consumed
+    from pytubefix import Channel, Playlist
+
+    collection = Playlist(link) if collection_kind(link) == "playlist" else Channel(link)
+    return itertools.islice(collection.url_generator(), limit)
+
+
+def prefetch_metadata(links, cache, on_result, max_workers=MAX_PREFETCH_WORKERS, cancel_event=None):
+    """Resolves metadata for many links at once on a bounded pool.
+
+    `links` may be lazy (e.g. iter_collection), so the first entries resolve while later
+    pages are still loading. on_result(link, info, error) is called from the worker
+    threads as each entry finishes, in completion order. Blocks until all are done.
+    """
+    cancel_event = cancel_event or threading.Event()
+
+    def resolve(link):
+        if cancel_event.is_set():
+            return
+        try:
+            info = cache.resolve(link)
+        except Exception as e:
+            on_result(link, None, e)
+        else:
+            on_result(link, info, None)
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prefetch") as pool:
+        for link in links:
+            if cancel_event.is_set():
+                break
+            pool.submit(resolve, link)
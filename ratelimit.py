@@ -0,0 +1,189 @@
+import heapq
+import itertools
+import re
+import threading
+import time
+from collections import deque
+
+from metrics import metrics
+
+# job weights when transfers compete for a capped bandwidth
+PRIORITY_LOW = 0.5
+PRIORITY_NORMAL = 1
+PRIORITY_HIGH = 4
+
+# the bucket holds this many seconds of traffic, so short stalls can be caught up on
+BURST_SECONDS = 0.25
+# throughput readings average over this many seconds
+THROUGHPUT_WINDOW = 2.0
+# how often blocked transfers look at their cancel flag
+WAIT_INTERVAL = 0.1
+
+# caps offered in the GUI, bytes per second
+RATE_LIMIT_PRESETS = {
+    "Unlimited": None,
+    "512 KB/s": 512 * 1024,
+    "1 MB/s": 1024 ** 2,
+    "2 MB/s": 2 * 1024 ** 2,
+    "5 MB/s": 5 * 1024 ** 2,
+    "10 MB/s": 10 * 1024 ** 2,
+}
+
+RATE_UNITS = {"": 1, "k": 1024, "m": 1024 ** 2, "g": 1024 ** 3}
+
+
+def parse_rate(text):
+    """Parses "500K", "2M" or "1.5MB" (bytes per second); "0" or "unlimited" mean no cap."""
+    text = text.strip().lower()
+    if text in ("0", "none", "unlimited"):
+        return None
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)\s*([kmg]?)i?b?(?:/s)?", text)
+    if not match:
+        raise ValueError(f"Invalid rate {text!r}, expected e.g. '500K' or '2M'")
+    return int(float(match.group(1)) * RATE_UNITS[match.group(2)])
+
+
+def format_rate(rate):
+    for unit, size in (("GB/s", 1024 ** 3), ("MB/s", 1024 ** 2), ("KB/s", 1024)):
+        if rate >= size:
+            return f"{rate / size:.1f} {unit}"
+    return f"{rate:.0f} B/s"
+
+
+class ThroughputMeter:
+    """Bytes per second over the last `window` seconds."""
+
+    def __init__(self, window=THROUGHPUT_WINDOW):
+        self.window = window
+        self._samples = deque()  # (time, nbytes)
+        self._lock = threading.Lock()
+
+    def add(self, nbytes):
+        now = time.monotonic()
+        with self._lock:
+            self._samples.append((now, nbytes))
+            self._trim(now)
+
+    @property
+    def rate(self):
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            return sum(n for _, n in self._samples) / self.window
+
+    def _trim(self, now):
+        while self._samples and self._samples[0][0] < now - self.window:
+            self._samples.popleft()
+
+
+class Flow:
+    """One transfer's handle on a RateLimiter; call consume() for every chunk received.
+
+    Flows created with the same `key` (e.g. a job's video and audio) share one fair
+    share, weighted by `priority`; each flow still measures its own throughput.
+    """
+
+    def __init__(self, limiter, key, priority):
+        self.limiter = limiter
+        self.key = key
+        self.priority = priority
+        self.meter = ThroughputMeter()
+        self.bytes = 0  # received so far, from every thread using the flow
+        self._lock = threading.Lock()
+
+    @property
+    def rate(self):
+        return self.meter.rate
+
+    def consume(self, nbytes, is_cancelled=None):
+        # blocks until the limiter lets `nbytes` through; returns early once is_cancelled() is true
+        self.limiter._consume(self, nbytes, is_cancelled)
+        with self._lock:
+            self.bytes += nbytes
+        self.meter.add(nbytes)
+        self.limiter.meter.add(nbytes)
+        metrics.inc("transfer_bytes_total", nbytes)
+
+
+class RateLimiter:
+    """Token bucket shared by every transfer, with weighted fair sharing between flows.
+
+    `rate` is in bytes per second, None for no cap, and can be changed while transfers
+    run. Blocked chunks are let through in start-time fair queuing order: each flow key
+    advances a virtual clock by bytes / priority, so a flow with priority 4 gets four
+    times the bandwidth of a priority 1 flow while both are busy, and an idle flow
+    can't bank a backlog of credit.
+    """
+
+    def __init__(self, rate=None):
+        self._rate = rate
+        self._tokens = 0.0
+        self._refilled_at = time.monotonic()
+        self._cond = threading.Condition()
+        self._waiting = []  # heap of (start tag, ticket) for blocked chunks
+        self._tickets = itertools.count()
+        self._tags = {}  # flow key -> virtual finish time of its last chunk
+        self._vtime = 0.0
+        self.meter = ThroughputMeter()
+
+    @property
+    def rate(self):
+        return self._rate
+
+    @rate.setter
+    def rate(self, rate):
+        with self._cond:
+            self._refill()
+            self._rate = rate
+            self._tokens = min(self._tokens, self._burst())
+            self._cond.notify_all()
+
+    @property
+    def throughput(self):
+        # aggregate bytes per second across every flow
+        return self.meter.rate
+
+    def flow(self, key=None, priority=PRIORITY_NORMAL):
+        return Flow(self, key if key is not None else object(), priority)
+
+    def _burst(self):
+        return self._rate * BURST_SECONDS if self._rate else 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        if self._rate:
+            self._tokens = min(self._burst(), self._tokens + (now - self._refilled_at) * self._rate)
+        self._refilled_at = now
+
+    def _consume(self, flow, nbytes, is_cancelled):
+        with self._cond:
+            if self._rate is None:
+                return
+            start = max(self._vtime, self._tags.get(flow.key, 0.0))
+            self._tags[flow.key] = start + nbytes / flow.priority
+            entry = (start, next(self._tickets))
+            heapq.heappush(self._waiting, entry)
+            try:
+                while self._rate is not None:
+                    if is_cancelled is not None and is_cancelled():
+                        return
+                    self._refill()
+                    at_head = self._waiting[0] == entry
+                    if at_head and self._tokens > 0:
+                        # the bucket may go into debt for a large chunk; later chunks wait it off
+                        self._tokens -= nbytes
+                        self._vtime = start
+                        break
+                    wait = min(WAIT_INTERVAL, -self._tokens / self._rate) if at_head else WAIT_INTERVAL
+                    self._cond.wait(max(wait, 0.001))
+            finally:
+                self._waiting.remove(entry)
+                heapq.heapify(self._waiting)
+                if len(self._tags) > 1000:
+                    # tags behind the virtual clock no longer matter
+                    self._tags = {key: tag for key, tag in self._tags.items() if tag > self._vtime}
+                self._cond.notify_all()
+
+
+# shared by every download and thumbnail in the process
+default_limiter = RateLimiter()
@@ -0,0 +1,59 @@
+"""Shared fixtures: an offline YouTube (benchmarks/fake_youtube.py) served by a local
+MediaServer, so every test runs without network access."""
+import os
+import shutil
+import sys
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT_DIR, os.path.join(ROOT_DIR, "benchmarks")]
+
+from downloader import SegmentedDownloader  # noqa: E402
+from engine import Engine  # noqa: E402
+from fake_youtube import FakeYouTubeBackend  # noqa: E402
+from media_server import MediaServer  # noqa: E402
+from metadata_cache import MetadataCache  # noqa: E402
+from ratelimit import RateLimiter  # noqa: E402
+
+# small segments, so even the test-sized streams split into several of them
+SEGMENT_SIZE = 64 * 1024
+# scales the canned 24 MB ladder down to a few hundred KB per stream
+SIZE_SCALE = 0.02
+
+
+@pytest.fixture
+def server():
+    server = MediaServer().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def backend(server):
+    return FakeYouTubeBackend(server, size_scale=SIZE_SCALE)
+
+
+@pytest.fixture
+def downloader():
+    # its own limiter, so a test's rate cap never leaks into another
+    return SegmentedDownloader(segment_size=SEGMENT_SIZE, limiter=RateLimiter())
+
+
+@pytest.fixture
+def make_engine(backend, downloader):
+    def make(**kwargs):
+        return Engine(MetadataCache(youtube=backend), downloader=downloader, **kwargs)
+    return make
+
+
+@pytest.fixture(scope="session")
+def media(tmp_path_factory):
+    # real H.264/AAC clips, for tests that merge
+    pytest.importorskip("ffmpeg")
+    if not shutil.which("ffmpeg"):
+        pytest.skip("ffmpeg is not installed")
+    from fixtures import FIXTURES, make_fixtures
+
+    paths = make_fixtures(str(tmp_path_factory.mktemp("fixtures")))
+    return {kind: (paths[kind], FIXTURES[kind][1]) for kind in ("video", "audio")}
@@ -0,0 +1,80 @@
+from archive import COMPACT_MIN_STALE_LINES, DownloadArchive
+from jobs import DONE, SKIPPED, DownloadJob
+
+
+def make_file(tmp_path, name="video.mp4", size=10):
+    path = tmp_path / name
+    path.write_bytes(b"x" * size)
+    return str(path)
+
+
+def test_entries_persist(tmp_path):
+    archive_path = str(tmp_path / "archive.jsonl")
+    video_path = make_file(tmp_path)
+
+    DownloadArchive(archive_path).add("abc", "both|best|", video_path)
+
+    entry = DownloadArchive(archive_path).get("abc", "both|best|")
+    assert entry["path"] == video_path
+    assert DownloadArchive(archive_path).get("abc", "audio|best|") is None
+
+
+def test_missing_or_changed_file_drops_entry(tmp_path):
+    archive_path = str(tmp_path / "archive.jsonl")
+    archive = DownloadArchive(archive_path)
+    archive.add("abc", "fmt", make_file(tmp_path, "a.mp4"))
+    archive.add("def", "fmt", make_file(tmp_path, "b.mp4"))
+    (tmp_path / "a.mp4").unlink()
+    (tmp_path / "b.mp4").write_bytes(b"shorter")
+
+    assert archive.get("abc", "fmt") is None
+    assert archive.get("def", "fmt") is None
+    assert len(DownloadArchive(archive_path)) == 0
+
+
+def test_torn_last_line_is_ignored(tmp_path):
+    archive_path = str(tmp_path / "archive.jsonl")
+    DownloadArchive(archive_path).add("abc", "fmt", make_file(tmp_path))
+    with open(archive_path, "a") as f:
+        f.write('{"video_id": "def", "for')
+
+    archive = DownloadArchive(archive_path)
+    archive.add("ghi", "fmt", make_file(tmp_path, "c.mp4"))
+
+    reloaded = DownloadArchive(archive_path)
+    assert len(reloaded) == 2
+    assert reloaded.get("ghi", "fmt") is not None
+
+
+def test_compacts_on_load(tmp_path):
+    archive_path = str(tmp_path / "archive.jsonl")
+    video_path = make_file(tmp_path)
+    archive = DownloadArchive(archive_path)
+    for _ in range(COMPACT_MIN_STALE_LINES + 1):
+        archive.add("abc", "fmt", video_path)
+
+    reloaded = DownloadArchive(archive_path)
+
+    with open(archive_path) as f:
+        assert len(f.readlines()) == 1
+    assert reloaded.get("abc", "fmt")["path"] == video_path
+
+
+def test_archived_jobs_are_skipped_without_lookups(backend, make_engine, tmp_path):
+    link = backend.add_video("abcdefghijk")
+    archive = DownloadArchive(str(tmp_path / "archive.jsonl"))
+    template = str(tmp_path / "{video_id}")
+
+    first = make_engine(archive=archive)
+    job = first.submit(DownloadJob(link, choice="video", output_template=template))
+    first.wait()
+    assert job.state == DONE
+
+    lookups = backend.lookups
+    second = make_engine(archive=DownloadArchive(archive.path))
+    repeat = second.submit(DownloadJob(link, choice="video", output_template=template))
+    second.wait()
+
+    assert repeat.state == SKIPPED
+    assert repeat.output_path == job.output_path
+    assert backend.lookups == lookups
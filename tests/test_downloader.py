@@ -0,0 +1,135 @@
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from downloader import MANIFEST_SUFFIX, PART_SUFFIX, DownloadCancelled, download_parallel
+from metadata_cache import StreamInfo
+
+
+def add_stream(server, name, size, itag=137):
+    data = os.urandom(size)
+    url = server.add(f"/{name}", data) + f"?itag={itag}"
+    return StreamInfo(itag=itag, url=url, filesize=size), data
+
+
+def read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def test_segmented_download(server, downloader, tmp_path):
+    stream, data = add_stream(server, "video", 1024 * 1024 + 123)
+    path = str(tmp_path / "video.mp4")
+
+    downloader.download_any(stream, path)
+
+    assert read(path) == data
+    assert not os.path.exists(path + PART_SUFFIX)
+    assert not os.path.exists(path + MANIFEST_SUFFIX)
+    assert server.requests >= len(downloader.segments(stream.filesize))
+
+
+def test_resume_refetches_corrupted_segment(server, downloader, tmp_path):
+    stream, data = add_stream(server, "video", 1024 * 1024)
+    path = str(tmp_path / "video.mp4")
+    segment_size = downloader.segment_size
+
+    # interrupt the download once a few segments are on disk
+    server.bandwidth = 256 * 1024
+    cancel_event = threading.Event()
+    errors = []
+
+    def interrupted():
+        try:
+            downloader.download_any(stream, path, cancel_event=cancel_event)
+        except DownloadCancelled as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=interrupted)
+    thread.start()
+    deadline = time.monotonic() + 10
+    completed = {}
+    while len(completed) < 4 and time.monotonic() < deadline:
+        time.sleep(0.05)
+        try:
+            with open(path + MANIFEST_SUFFIX) as f:
+                completed = json.load(f)["completed"]
+        except (OSError, ValueError):
+            pass
+    cancel_event.set()
+    thread.join()
+    assert errors and len(completed) >= 4
+
+    with open(path + MANIFEST_SUFFIX) as f:
+        completed = json.load(f)["completed"]
+    corrupted = int(min(completed, key=int))
+    with open(path + PART_SUFFIX, "r+b") as f:
+        f.seek(corrupted + 10)
+        f.write(b"\0" * 100)
+
+    server.bandwidth = None
+    flow = downloader.limiter.flow()
+    downloader.download_any(stream, path, flow=flow)
+
+    assert read(path) == data
+    # every verified segment was reused, the corrupted one was fetched again
+    reused = (len(completed) - 1) * segment_size
+    assert flow.bytes == len(data) - reused
+
+
+def test_range_fallback_keeps_caller_event_clear(server, downloader, tmp_path):
+    stream, data = add_stream(server, "video", 512 * 1024)
+    server.ranges = False
+    cancel_event = threading.Event()
+    path = str(tmp_path / "video.mp4")
+
+    downloader.download_any(stream, path, cancel_event=cancel_event)
+
+    assert read(path) == data
+    assert not cancel_event.is_set()
+    assert b"".join(downloader.iter_stream(stream, cancel_event=cancel_event)) == data
+
+
+def test_parallel_failure_reports_root_cause(server, downloader, tmp_path):
+    stream, _ = add_stream(server, "video", 512 * 1024)
+    missing = StreamInfo(itag=140, url=server.base_url + "/missing?itag=140", filesize=1000)
+    cancel_event = threading.Event()
+
+    with pytest.raises(Exception) as error:
+        download_parallel([(stream, str(tmp_path / "v")), (missing, str(tmp_path / "a"))],
+                          cancel_event=cancel_event, downloader=downloader)
+
+    assert not isinstance(error.value, DownloadCancelled)
+    assert "404" in str(error.value)
+    assert not cancel_event.is_set()
+
+
+def test_parallel_calls_do_not_share_workers(server, downloader, tmp_path):
+    # four jobs downloading video + audio at once: all eight streams transfer together
+    server.bandwidth = 256 * 1024
+    calls = []
+    for n in range(4):
+        pair = [add_stream(server, f"{name}{n}", 512 * 1024)[0] for name in ("video", "audio")]
+        calls.append([(stream, str(tmp_path / f"{n}-{i}")) for i, stream in enumerate(pair)])
+    cancel_event = threading.Event()
+
+    def run(downloads):
+        with pytest.raises(DownloadCancelled):
+            download_parallel(downloads, cancel_event=cancel_event, downloader=downloader)
+
+    threads = [threading.Thread(target=run, args=(downloads,)) for downloads in calls]
+    for thread in threads:
+        thread.start()
+
+    deadline = time.monotonic() + 1.5
+    while len(os.listdir(tmp_path)) < 16 and time.monotonic() < deadline:
+        time.sleep(0.02)
+    started = len([name for name in os.listdir(tmp_path) if name.endswith(PART_SUFFIX)])
+    cancel_event.set()
+    for thread in threads:
+        thread.join()
+
+    assert started == 8
@@ -0,0 +1,66 @@
+import pytest
+
+from formats import DEFAULT_FORMAT, FormatSelector
+from metadata_cache import StreamInfo, sort_streams
+
+
+def video(itag, subtype, codec, resolution, fps=30):
+    return StreamInfo(itag=itag, mime_type=f"video/{subtype}", type="video", subtype=subtype, video_codec=codec,
+                      resolution=resolution, fps=fps, filesize=1000)
+
+
+def audio(itag, subtype, codec, abr):
+    return StreamInfo(itag=itag, mime_type=f"audio/{subtype}", type="audio", subtype=subtype, audio_codec=codec,
+                      abr=abr, filesize=100)
+
+
+VIDEO = [
+    video(137, "mp4", "avc1.640028", "1080p"),
+    video(248, "webm", "vp9", "1080p"),
+    video(136, "mp4", "avc1.4d401f", "720p"),
+    video(313, "webm", "vp9", "2160p"),
+]
+AUDIO = [
+    audio(140, "mp4", "mp4a.40.2", "128kbps"),
+    audio(251, "webm", "opus", "160kbps"),
+]
+
+
+def itags(picked):
+    return [stream.itag if stream else None for stream in picked]
+
+
+@pytest.mark.parametrize("spec, choice, expected", [
+    (DEFAULT_FORMAT, "both", [137, 140]),
+    ("bestvideo+bestaudio", "both", [313, 251]),
+    ("bestvideo[height<=720]+bestaudio", "both", [136, 251]),
+    ("bv[ext=webm]+ba[acodec=opus]", "both", [313, 251]),
+    ("bv[vcodec^=avc]+ba[ext=m4a]", "both", [137, 140]),
+    ("best[height<=?720]", "both", [136, 251]),
+    ("bestvideo[height>4000]/worstvideo", "video", [136, None]),
+    ("bestaudio", "audio", [None, 251]),
+    ("worstaudio", "audio", [None, 140]),
+])
+def test_select(spec, choice, expected):
+    assert itags(FormatSelector(spec).select(VIDEO, AUDIO, choice)) == expected
+
+
+def test_select_keeps_hand_picked_video():
+    picked = FormatSelector("bestvideo+bestaudio[ext=m4a]").select(VIDEO, AUDIO, video=VIDEO[2])
+    assert itags(picked) == [136, 140]
+
+
+def test_no_match_raises():
+    with pytest.raises(ValueError, match="No streams match"):
+        FormatSelector("bestvideo[height>4000]").select(VIDEO, AUDIO, "video")
+
+
+@pytest.mark.parametrize("spec", ["", "bestvideo[height<<720]", "mp4", "bestvideo[colour=red]"])
+def test_invalid_spec_raises(spec):
+    with pytest.raises(ValueError):
+        FormatSelector(spec)
+
+
+def test_sort_streams_ranks_best_first():
+    # resolution first, then the more efficient codec
+    assert [s.itag for s in sort_streams(VIDEO)] == [313, 248, 137, 136]
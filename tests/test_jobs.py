@@ -0,0 +1,126 @@
+import os
+import threading
+import time
+
+from jobs import CANCELLED, DONE, DOWNLOADING, QUEUED, WAITING, DownloadJob
+
+
+def wait_for(predicate, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.02)
+
+
+def test_merged_download(backend, make_engine, media, tmp_path):
+    link = backend.add_video("abcdefghijk", media=media)
+    engine = make_engine()
+
+    job = engine.submit(DownloadJob(link, output_template=str(tmp_path / "{video_id}")))
+    engine.wait()
+
+    assert job.state == DONE, job.status
+    assert job.output_path == str(tmp_path / "abcdefghijk.mp4")
+    assert os.listdir(tmp_path) == ["abcdefghijk.mp4"]
+
+
+def test_duplicate_jobs_run_one_after_another(backend, make_engine, media, tmp_path):
+    # the same video queued twice shares temp and .part files, so the jobs must not overlap
+    link = backend.add_video("abcdefghijk", media=media)
+    engine = make_engine()
+
+    jobs = [engine.submit(DownloadJob(link, output_template=str(tmp_path / "{video_id}"))) for _ in range(2)]
+    engine.wait()
+
+    assert [job.state for job in jobs] == [DONE, DONE], [job.status for job in jobs]
+    assert os.listdir(tmp_path) == ["abcdefghijk.mp4"]
+
+
+def test_range_fallback_completes_job(server, backend, make_engine, media, tmp_path):
+    server.ranges = False
+    link = backend.add_video("abcdefghijk", media=media)
+    engine = make_engine()
+
+    jobs = [
+        engine.submit(DownloadJob(link, choice=choice, output_template=str(tmp_path / choice / "{video_id}")))
+        for choice in ("video", "both")
+    ]
+    engine.wait()
+
+    assert [job.state for job in jobs] == [DONE, DONE], [job.status for job in jobs]
+
+
+def test_cancel_while_waiting_for_download_slot(server, backend, make_engine, tmp_path):
+    server.bandwidth = 256 * 1024
+    links = [backend.add_video(video_id) for video_id in ("aaaaaaaaaaa", "bbbbbbbbbbb")]
+    engine = make_engine(max_downloads=1)
+    template = str(tmp_path / "{video_id}")
+
+    first = engine.submit(DownloadJob(links[0], choice="video", output_template=template))
+    wait_for(lambda: first.bytes_done)
+    second = engine.submit(DownloadJob(links[1], choice="video", output_template=template))
+    wait_for(lambda: second.state == WAITING)
+
+    second.cancel()
+    wait_for(lambda: second.finished, timeout=1)
+
+    assert second.state == CANCELLED
+    assert not first.finished
+    first.cancel()
+    engine.wait()
+
+
+def test_cancel_while_waiting_for_merge_slot_removes_temp_streams(backend, make_engine, tmp_path):
+    link = backend.add_video("abcdefghijk")
+    engine = make_engine(max_merges=1)
+    engine.scheduler._merge_slots.acquire()  # as if another job were merging
+    try:
+        job = engine.submit(DownloadJob(link, output_template=str(tmp_path / "{video_id}")))
+        wait_for(lambda: job.state == WAITING and job.bytes_done == job.bytes_total)
+        assert len(os.listdir(tmp_path)) == 2
+
+        job.cancel()
+        engine.wait()
+    finally:
+        engine.scheduler._merge_slots.release()
+
+    assert job.state == CANCELLED
+    assert os.listdir(tmp_path) == []
+
+
+def test_cancelled_sequential_download_leaves_no_file(server, backend, make_engine, tmp_path):
+    server.ranges = False
+    server.bandwidth = 256 * 1024
+    link = backend.add_video("abcdefghijk")
+    engine = make_engine()
+
+    job = engine.submit(DownloadJob(link, choice="video", output_template=str(tmp_path / "{video_id}")))
+    # pytubefix reads each range in one go, so progress only shows at the end
+    wait_for(lambda: job.state == DOWNLOADING)
+    time.sleep(0.5)
+    job.cancel()
+    engine.wait()
+
+    assert job.state == CANCELLED
+    assert os.listdir(tmp_path) == []
+
+
+def test_jobs_beyond_capacity_wait_without_threads(server, backend, make_engine, tmp_path):
+    server.bandwidth = 256 * 1024
+    engine = make_engine(max_fetches=1, max_downloads=1, max_merges=1)
+    capacity = engine.scheduler.max_active
+    links = [backend.add_video(f"video{n:06d}") for n in range(capacity + 5)]
+    jobs = [engine.submit(DownloadJob(link, choice="video", output_template=str(tmp_path / "{video_id}")))
+            for link in links]
+
+    job_threads = [thread for thread in threading.enumerate() if thread.name.startswith("job-")]
+    assert len(job_threads) == capacity
+    queued = jobs[-1]
+    assert queued.state == QUEUED and queued._thread is None
+
+    queued.cancel()
+    assert queued.state == CANCELLED
+    for job in jobs:
+        job.cancel()
+    engine.wait()
+    assert all(job.state == CANCELLED for job in jobs)
@@ -0,0 +1,66 @@
+import threading
+
+import pytest
+
+import metadata_cache
+from metadata_cache import MetadataCache
+
+
+def test_concurrent_resolves_share_one_lookup(backend):
+    backend.latency = 0.2
+    link = backend.add_video("abcdefghijk")
+    cache = MetadataCache(youtube=backend)
+
+    threads = [threading.Thread(target=cache.resolve, args=(link,)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert backend.lookups == 1
+    assert cache.get(link).title == "Video abcdefghijk"
+
+
+def test_failed_resolve_releases_its_lock(backend):
+    cache = MetadataCache(youtube=backend)
+
+    with pytest.raises(ValueError):
+        cache.resolve("https://youtu.be/unknown0000")
+
+    assert cache._resolving == {}
+
+
+def test_disk_writes_are_batched(backend, tmp_path, monkeypatch):
+    monkeypatch.setattr(metadata_cache, "SAVE_DELAY", 60)
+    links = [backend.add_video(f"video{n:06d}") for n in range(20)]
+    disk_path = tmp_path / "cache.json"
+    cache = MetadataCache(disk_path=str(disk_path), youtube=backend)
+
+    for link in links:
+        cache.resolve(link)
+    assert not disk_path.exists()
+
+    cache.flush()
+    reloaded = MetadataCache(disk_path=str(disk_path), youtube=backend)
+    lookups = backend.lookups
+    for link in links:
+        reloaded.resolve(link)
+    assert backend.lookups == lookups
+
+
+def test_disk_entry_resolves_live_streams_with_one_lookup(backend, tmp_path):
+    link = backend.add_video("abcdefghijk")
+    disk_path = str(tmp_path / "cache.json")
+    cache = MetadataCache(disk_path=disk_path, youtube=backend)
+    cache.resolve(link)
+    cache.flush()
+
+    reloaded = MetadataCache(disk_path=disk_path, youtube=backend)
+    info = reloaded.resolve(link)
+    lookups = backend.lookups
+    video = reloaded.pytube_stream(link, info.video_streams[0])
+    audio = reloaded.pytube_stream(link, info.audio_streams[0])
+
+    assert backend.lookups == lookups + 1
+    assert (video.itag, audio.itag) == (info.video_streams[0].itag, info.audio_streams[0].itag)
+    assert all(stream.stream is not None for stream in info.video_streams + info.audio_streams)
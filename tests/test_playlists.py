@@ -0,0 +1,20 @@
+import pytest
+
+from playlists import collection_kind
+
+
+@pytest.mark.parametrize("link, kind", [
+    ("https://www.youtube.com/watch?v=dQw4w9WgXcQ", None),
+    ("https://youtu.be/dQw4w9WgXcQ", None),
+    # what the Share button gives inside a playlist: still one video
+    ("https://youtu.be/dQw4w9WgXcQ?list=PLabcdefghijklmnop", None),
+    ("https://www.youtube.com/watch?v=dQw4w9WgXcQ&list=PLabcdefghijklmnop", None),
+    ("https://www.youtube.com/embed/dQw4w9WgXcQ?list=PLabcdefghijklmnop", None),
+    ("https://www.youtube.com/playlist?list=PLabcdefghijklmnop", "playlist"),
+    ("https://www.youtube.com/watch?list=PLabcdefghijklmnop", "playlist"),
+    ("https://www.youtube.com/@SomeChannel", "channel"),
+    ("https://www.youtube.com/channel/UCabcdefghijklmnopqrstuv/videos", "channel"),
+    ("https://www.youtube.com/c/SomeChannel", "channel"),
+])
+def test_collection_kind(link, kind):
+    assert collection_kind(link) == kind
@@ -0,0 +1,93 @@
+import os
+import threading
+import time
+
+import pytest
+
+from ratelimit import PRIORITY_HIGH, PRIORITY_NORMAL, RateLimiter, format_rate, parse_rate
+
+MB = 1024 ** 2
+
+
+@pytest.mark.parametrize("text, rate", [
+    ("500K", 500 * 1024),
+    ("2M", 2 * MB),
+    ("1.5MB", int(1.5 * MB)),
+    ("750kib/s", 750 * 1024),
+    ("0", None),
+    ("unlimited", None),
+])
+def test_parse_rate(text, rate):
+    assert parse_rate(text) == rate
+
+
+def test_parse_rate_rejects_garbage():
+    with pytest.raises(ValueError):
+        parse_rate("fast")
+
+
+def test_format_rate():
+    assert format_rate(1.5 * MB) == "1.5 MB/s"
+    assert format_rate(100) == "100 B/s"
+
+
+def test_download_respects_cap(server, downloader, tmp_path):
+    from metadata_cache import StreamInfo
+
+    size = 2 * MB
+    url = server.add("/video", os.urandom(size)) + "?itag=137"
+    downloader.limiter.rate = MB
+
+    start = time.monotonic()
+    downloader.download_any(StreamInfo(itag=137, url=url, filesize=size), str(tmp_path / "video.mp4"))
+    elapsed = time.monotonic() - start
+
+    # the bucket starts empty, so the whole size is paid for at the capped rate
+    assert size / MB * 0.85 <= elapsed <= size / MB * 1.3
+
+
+def test_priorities_share_bandwidth_by_weight():
+    limiter = RateLimiter(2 * MB)
+    flows = {"high": limiter.flow("high", PRIORITY_HIGH), "normal": limiter.flow("normal", PRIORITY_NORMAL)}
+    stop = threading.Event()
+
+    def transfer(flow):
+        while not stop.is_set():
+            flow.consume(16 * 1024, stop.is_set)
+
+    threads = [threading.Thread(target=transfer, args=(flow,)) for flow in flows.values()]
+    for thread in threads:
+        thread.start()
+    time.sleep(2)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    total = flows["high"].bytes + flows["normal"].bytes
+    assert total <= 2 * MB * 2.5
+    assert 3 <= flows["high"].bytes / flows["normal"].bytes <= 5
+
+
+def test_cancel_wakes_blocked_transfer():
+    limiter = RateLimiter(1024)
+    flow = limiter.flow()
+    cancelled = threading.Event()
+    threading.Timer(0.2, cancelled.set).start()
+
+    start = time.monotonic()
+    flow.consume(10 * MB, cancelled.is_set)
+    flow.consume(10 * MB, cancelled.is_set)
+
+    assert time.monotonic() - start < 1
+
+
+def test_raising_the_cap_applies_to_running_transfers():
+    limiter = RateLimiter(1024)
+    flow = limiter.flow()
+    flow.consume(64 * 1024)  # puts the bucket ~64s in debt at 1 KB/s
+    threading.Timer(0.2, setattr, (limiter, "rate", None)).start()
+
+    start = time.monotonic()
+    flow.consume(64 * 1024)
+
+    assert time.monotonic() - start < 1
@@ -0,0 +1,35 @@
+from io import BytesIO
+
+import pytest
+import requests
+
+from ratelimit import RateLimiter
+from thumbnails import THUMBNAIL_SIZE, ThumbnailCache
+
+
+def test_failed_download_releases_its_lock(server):
+    cache = ThumbnailCache()
+
+    with pytest.raises(requests.HTTPError):
+        cache.get("abcdefghijk", server.base_url + "/missing.jpg")
+
+    assert cache._loading == {}
+
+
+def jpeg(color):
+    from PIL import Image
+
+    data = BytesIO()
+    Image.new("RGB", (640, 360), color).save(data, "JPEG")
+    return data.getvalue()
+
+
+def test_downloads_share_the_thumbnails_flow(server):
+    images = {video_id: jpeg(color) for video_id, color in (("aaaaaaaaaaa", "red"), ("bbbbbbbbbbb", "blue"))}
+    cache = ThumbnailCache(limiter=RateLimiter())
+
+    for video_id, data in images.items():
+        image = cache.get(video_id, server.add(f"/{video_id}.jpg", data))
+        assert image.size == THUMBNAIL_SIZE
+
+    assert cache.flow.bytes == sum(len(data) for data in images.values())
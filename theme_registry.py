@@ -0,0 +1,88 @@
+import customtkinter as ctk
+
+
+def _same_color(a, b):
+    # theme files store colors as lists, widgets may hold them as tuples
+    if isinstance(a, (list, tuple)) and isinstance(b, (list, tuple)):
+        return tuple(a) == tuple(b)
+    return a == b
+
+
+class ThemeRegistry:
+    """Parsed color themes, keyed by display name and loaded at most once each.
+
+    `options` maps names to a built-in theme name or a theme JSON path, like
+    THEME_OPTIONS in main.py with the paths already resolved. Loading briefly swaps
+    customtkinter's active theme, so use it from the Tk main thread only.
+    """
+
+    def __init__(self, options):
+        self.options = options
+        self._themes = {}
+
+    def get(self, name) -> dict:
+        theme = self._themes.get(name)
+        if theme is None:
+            theme = self._themes[name] = self._load(self.options[name])
+        return theme
+
+    def activate(self, name, root=None):
+        """Makes `name` the theme for new widgets and recolors the widgets under `root` in place."""
+        old_theme = ctk.ThemeManager.theme
+        new_theme = self.get(name)
+        ctk.ThemeManager.theme = new_theme
+        ctk.ThemeManager._currently_loaded_theme = self.options[name]
+        if root is not None and old_theme:
+            recolor_widgets(root, old_theme, new_theme)
+
+    @staticmethod
+    def _load(setting):
+        # reuse customtkinter's parser (platform values, key fixes) without touching the active theme
+        active, active_name = ctk.ThemeManager.theme, ctk.ThemeManager._currently_loaded_theme
+        try:
+            ctk.ThemeManager.load_theme(setting)
+            return ctk.ThemeManager.theme
+        finally:
+            ctk.ThemeManager.theme, ctk.ThemeManager._currently_loaded_theme = active, active_name
+
+
+def recolor_widgets(root, old_theme, new_theme):
+    """Moves every widget under `root` from `old_theme` colors to `new_theme` colors.
+
+    Only colors that still equal the old theme's default are replaced, so colors the app
+    set explicitly (status text, the selected stream button) are kept.
+    """
+    stack = [root]
+    while stack:
+        widget = stack.pop()
+        _recolor_widget(widget, old_theme, new_theme)
+        stack.extend(reversed(widget.winfo_children()))
+
+
+def _recolor_widget(widget, old_theme, new_theme):
+    section = type(widget).__name__
+    old, new = old_theme.get(section, {}), new_theme.get(section, {})
+
+    changes = {}
+    for key, old_value in old.items():
+        if "color" not in key or key == "top_fg_color" or key not in new:
+            continue
+        try:
+            current = widget.cget(key)
+        except Exception:
+            continue
+        if _same_color(current, old_value):
+            value = new[key]
+        elif key == "fg_color" and "top_fg_color" in old and _same_color(current, old["top_fg_color"]):
+            value = new.get("top_fg_color", new[key])  # frame nested in another frame
+        else:
+            continue
+        if not _same_color(current, value):
+            changes[key] = value
+
+    if isinstance(widget, ctk.CTkScrollableFrame):
+        # its outer frame was recolored on the way down; re-applying syncs the inner canvas
+        changes.setdefault("fg_color", widget.cget("fg_color"))
+
+    if changes:
+        widget.configure(**changes)
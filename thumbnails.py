@@ -0,0 +1,148 @@
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from downloader import create_session
+from metrics import metrics
+from ratelimit import default_limiter
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_SIZE = (240, 135)
+DEFAULT_MAX_ENTRIES = 64
+MAX_THUMBNAIL_WORKERS = 4
+REQUEST_TIMEOUT = 10
+CHUNK_SIZE = 16 * 1024
+
+
+class ThumbnailCache:
+    """Resized thumbnails keyed by video ID: in-memory LRU, then `disk_dir`, then the network.
+
+    Images are downloaded over one pooled session and decoded and resized once; the
+    resized JPEG is what goes to disk, so a warm start skips the download entirely.
+    Concurrent requests for the same video share a single fetch. All downloads go
+    through one "thumbnails" flow on `limiter`, under the same cap as the transfers.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, disk_dir=None, size=THUMBNAIL_SIZE, session=None,
+                 max_workers=MAX_THUMBNAIL_WORKERS, limiter=None):
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self.size = size
+        self.max_workers = max_workers
+        self._session = session
+        self.flow = (limiter or default_limiter).flow("thumbnails")
+        self._entries = OrderedDict()  # video_id -> resized PIL image
+        self._lock = threading.Lock()
+        self._loading: dict = {}  # video_id -> lock held while that thumbnail is being loaded
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="thumbnail")
+
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    @property
+    def session(self):
+        # only touched from the pool threads, created with the first download
+        with self._lock:
+            if self._session is None:
+                self._session = create_session(self.max_workers)
+            return self._session
+
+    def get(self, video_id, url):
+        image = self._get(video_id)
+        if image is not None:
+            return image
+
+        with self._lock:
+            video_lock = self._loading.setdefault(video_id, threading.Lock())
+
+        try:
+            with video_lock:
+                image = self._get(video_id)
+                if image is None:
+                    with metrics.span("thumbnail", video_id=video_id) as span:
+                        image = self._load_disk(video_id)
+                        span["source"] = "disk"
+                        if image is None:
+                            span["source"] = "network"
+                            image = self._download(url)
+                            self._save_disk(video_id, image)
+                    self._put(video_id, image)
+        finally:
+            # also after a failed download, or every failed video ID would keep its lock
+            with self._lock:
+                self._loading.pop(video_id, None)
+        return image
+
+    def fetch_async(self, video_id, url, callback):
+        # callback(image, error) runs on a pool thread once the thumbnail is ready
+        def run():
+            try:
+                image = self.get(video_id, url)
+            except Exception as e:
+                callback(None, e)
+            else:
+                callback(image, None)
+
+        return self._pool.submit(run)
+
+    def _get(self, video_id):
+        with self._lock:
+            image = self._entries.get(video_id)
+            if image is not None:
+                self._entries.move_to_end(video_id)
+            return image
+
+    def _put(self, video_id, image):
+        with self._lock:
+            self._entries[video_id] = image
+            self._entries.move_to_end(video_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _download(self, url):
+        from PIL import Image
+
+        data = BytesIO()
+        with self.session.get(url, stream=True, timeout=REQUEST_TIMEOUT) as response:
+            response.raise_for_status()
+            for chunk in response.iter_content(CHUNK_SIZE):
+                self.flow.consume(len(chunk))
+                data.write(chunk)
+        data.seek(0)
+        image = Image.open(data).convert("RGB")
+        return image.resize(self.size)
+
+    def _disk_file(self, video_id):
+        return os.path.join(self.disk_dir, f"{video_id}_{self.size[0]}x{self.size[1]}.jpg")
+
+    def _load_disk(self, video_id):
+        if not self.disk_dir:
+            return None
+        path = self._disk_file(video_id)
+        if not os.path.exists(path):
+            return None
+
+        from PIL import Image
+
+        try:
+            with Image.open(path) as image:
+                image.load()
+                return image.copy()
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable thumbnail {path}: {e}")
+            return None
+
+    def _save_disk(self, video_id, image):
+        if not self.disk_dir:
+            return
+        path = self._disk_file(video_id)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            image.save(tmp_path, "JPEG", quality=90)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Failed to save thumbnail {path}: {e}")
@@ -0,0 +1,42 @@
+import threading
+
+UI_FRAME_RATE = 30  # widget updates applied per second
+
+
+class UiUpdateQueue:
+    """Thread-safe queue of widget updates, applied by the Tk main loop once per frame.
+
+    Worker threads never touch widgets or schedule Tk callbacks themselves. call() queues
+    an update that runs once, in order; coalesce() keeps only the latest update per key,
+    so a job reporting progress for every chunk costs one widget refresh per frame.
+    """
+
+    def __init__(self, master, fps=UI_FRAME_RATE):
+        self.master = master
+        self.interval = max(1, int(1000 / fps))
+        self._lock = threading.Lock()
+        self._calls = []
+        self._latest = {}  # key -> (fn, args); dicts keep first-queued order
+        self.master.after(self.interval, self._drain)
+
+    def call(self, fn, *args):
+        with self._lock:
+            self._calls.append((fn, args))
+
+    def coalesce(self, key, fn, *args):
+        with self._lock:
+            self._latest[key] = (fn, args)
+
+    def _drain(self):
+        with self._lock:
+            calls, self._calls = self._calls, []
+            latest, self._latest = self._latest, {}
+
+        # one-off updates first, so e.g. a queue row exists before its refresh runs
+        for fn, args in calls + list(latest.values()):
+            try:
+                fn(*args)
+            except Exception as e:
+                print(f"UI update failed: {e}")
+
+        self.master.after(self.interval, self._drain)